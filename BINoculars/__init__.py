@@ -31,11 +31,13 @@ def run(args):
         filename = main.dispatcher.config.destination.final_filename()
         return BINoculars.space.Space.fromfile(filename)
 
-def load(filename, key = None):
+def load(filename, key = None, resolution = None):
     ''' Parameters
         filename: string
             Only hdf5 files are acceptable
         key: a tuple with slices in as much dimensions as the space is
+        resolution: float or a tuple with a float per dimension
+            load the coarsest pyramid level stored in the file that is at least this fine
 
         Returns
         A BINoculars space
@@ -51,7 +53,7 @@ def load(filename, key = None):
     '''
     import BINoculars.space
     if os.path.exists(filename):
-        return BINoculars.space.Space.fromfile(filename, key = key)
+        return BINoculars.space.Space.fromfile(filename, key = key, resolution = resolution)
     else:
         raise IOError("File '{0}' does not exist".format(filename))
 
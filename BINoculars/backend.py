@@ -1,4 +1,4 @@
-from . import util, errors, dispatcher
+from . import util, errors, dispatcher, space
 
 
 class ProjectionBase(util.ConfigurableObject):
@@ -12,6 +12,28 @@ class ProjectionBase(util.ConfigurableObject):
                 raise errors.ConfigError('dimension mismatch between projection axes ({0}) and resolution specification ({1}) in {2}', labels, self.config.resolution, self.__class__.__name__)
         else:
             self.config.resolution = tuple([float(res)] * len(labels))
+        limits = config.pop('limits', None)# optionally, fix the extent of the output per axis, e.g. [0:4,-1:1,:] (empty for unbounded), data outside is discarded, or 'auto' to determine the extent in a planning pass (reads every image twice unless the input implements a cheap plan_job())
+        if limits is None:
+            self.config.limits = None
+        elif limits.strip().lower() == 'auto':
+            self.config.limits = 'auto'
+        else:
+            try:
+                self.config.limits = util.parse_pairs(limits)
+            except ValueError as e:
+                raise errors.ConfigError('invalid limits specification in {0}: {1}'.format(self.__class__.__name__, e))
+            if not len(labels) == len(self.config.limits):
+                raise errors.ConfigError('dimension mismatch between projection axes ({0}) and limits specification ({1}) in {2}'.format(labels, self.config.limits, self.__class__.__name__))
+        self.config.axes = None # output Axes determined by the planning pass when limits = auto
+        self.config.maxmemory = util.parse_bytes(config.pop('maxmemory', '0'))# optionally, refuse to start when the output with known limits needs more memory, e.g. 4GB (no limit by default)
+        dtype = config.pop('dtype', None)# optionally, numpy types of photons and contributions, e.g. float32, uint16 to reduce memory and file size (float64, uint32 by default)
+        try:
+            self.config.dtype = None if dtype is None else space.get_dtype(util.parse_tuple(dtype.replace(' ', ''), length=2))
+        except (ValueError, TypeError) as e:
+            raise errors.ConfigError('invalid dtype specification in {0}: {1}'.format(self.__class__.__name__, e))
+        self.config.storage = config.pop('storage', 'dense').lower()# optionally, 'sparse' for mostly empty output grids or 'hdf5' for output grids larger than memory
+        if self.config.storage not in space.storage_classes:
+            raise errors.ConfigError("invalid storage '{0}' in {1}, expected one of {2}".format(self.config.storage, self.__class__.__name__, ', '.join(sorted(space.storage_classes))))
 
     def project(self, *args):
         raise NotImplementedError
@@ -26,6 +48,13 @@ class Job(object):
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
 
+    def split_range(self, first, last, target_weight):
+        """Returns Job()s covering the inclusive range between the attributes named first and last (e.g. 'firstpoint'
+        and 'lastpoint') in parts of at most about target_weight, see util.chunk_slicer(). The weight of a part is its length."""
+        start = getattr(self, first)
+        return [Job(**dict(self.__dict__, **{first: start + s.start, last: start + s.stop - 1, 'weight': s.stop - s.start}))
+                for s in util.chunk_slicer(getattr(self, last) - start + 1, target_weight)]
+
 
 class InputBase(util.ConfigurableObject):
     """Generate and process Job()s. 
@@ -41,6 +70,18 @@ class InputBase(util.ConfigurableObject):
         """Receives command from user, yields Job() instances"""
         raise NotImplementedError
 
+    def split_job(self, job, target_weight):
+        """Returns a list of Job()s that together do the same as job, each of about target_weight if possible.
+        Used by the Local dispatcher to balance the load, the default implementation does not split."""
+        return [job]
+
+    def plan_job(self, job):
+        """Like process_job(), but only needs to cover the extent of the data, e.g. the edges of the detector
+        or a strided subset of the pixels, and the intensity is ignored. Used by the planning pass for
+        'limits = auto'. The default reads and projects every image, such that the images are processed twice:
+        override it to avoid reading the images."""
+        return self.process_job(job)
+
     def process_jobs(self, job):
         """Receives a Job() instance, yields (intensity, args_to_be_sent_to_a_Projection_instance)
 
@@ -84,6 +84,9 @@ class EDFInput(backend.InputBase):
         for s in util.chunk_slicer(imgcount, self.config.target_weight):
             yield backend.Job(images=imgs, firstimage=s.start, lastimage=s.stop-1, weight=s.stop-s.start)
 
+    def split_job(self, job, target_weight):
+        return job.split_range('firstimage', 'lastimage', target_weight)
+
     def process_job(self, job):
         images = self.get_images(job.images, job.firstimage, job.lastimage) # iterator!
         
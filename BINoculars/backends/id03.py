@@ -213,6 +213,8 @@ class GammaDeltaMu(HKLProjection):#just passing on the coordinates, makes it eas
         return 'Gamma','Delta','Mu'
 
 class ID03Input(backend.InputBase):
+    plan_stride = 8 # pixel stride of the planning pass, see plan_job()
+
     # OFFICIAL API
     def generate_jobs(self, command):
         scans = util.parse_multi_range(','.join(command).replace(' ', ','))
@@ -234,6 +236,9 @@ class ID03Input(backend.InputBase):
             else:
                 yield backend.Job(scan=scanno, firstpoint=0, lastpoint=pointcount-1, weight=pointcount)
 
+    def split_job(self, job, target_weight):
+        return job.split_range('firstpoint', 'lastpoint', target_weight)
+
     def process_job(self, job):
         scan = self.get_scan(job.scan)
         
@@ -244,6 +249,21 @@ class ID03Input(backend.InputBase):
         for pp, image in itertools.izip(pointparams, images):
             yield self.process_image(scanparams, pp, image)
 
+    def plan_job(self, job):
+        # no images are read: project a dummy image, using every plan_stride-th pixel and the detector edges
+        scan = self.get_scan(job.scan)
+
+        scanparams = self.get_scan_params(scan) # wavelength, UB
+        pointparams = self.get_point_params(scan, job.firstpoint, job.lastpoint)
+        size = max(self.config.xmask.max(), self.config.ymask.max()) + 1
+        image = numpy.ones((size, size))
+
+        for pp in pointparams:
+            intensity, (wavelength, UB, gamma_range, delta_range, theta, mu, chi, phi) = self.process_image(scanparams, pp, image)
+            gi = numpy.union1d(numpy.arange(0, gamma_range.size, self.plan_stride), [gamma_range.size - 1])
+            di = numpy.union1d(numpy.arange(0, delta_range.size, self.plan_stride), [delta_range.size - 1])
+            yield intensity[numpy.ix_(gi, di)], (wavelength, UB, gamma_range[gi], delta_range[di], theta, mu, chi, phi)
+
     def parse_config(self, config):
         super(ID03Input, self).parse_config(config)
         self.config.xmask = util.parse_multi_range(config.pop('xmask'))#image range in the x direction
@@ -79,6 +79,9 @@ class ID03Input(backend.InputBase):
             else:
                 yield backend.Job(scan=scanno, firstpoint=0, lastpoint=pointcount-1, weight=pointcount)
 
+    def split_job(self, job, target_weight):
+        return job.split_range('firstpoint', 'lastpoint', target_weight)
+
     def process_job(self, job):
         scan = self.get_scan(job.scan)
         
@@ -1,6 +1,9 @@
 import os
+import sys
 import time
+import Queue
 import itertools
+import threading
 import subprocess
 import multiprocessing
 
@@ -10,6 +13,7 @@ from . import util, errors, space
 class Destination(object):
     type = filename = overwrite = value = config = None
     opts = {}
+    fileoptions = {}
     
     def set_final_filename(self, filename, overwrite):
         self.type = 'final'
@@ -39,7 +43,7 @@ class Destination(object):
         elif self.type == 'final':
             fn = self.final_filename()
             space.config = self.config
-            space.tofile(fn)
+            space.tofile(fn, **self.fileoptions)
 
     def retrieve(self):
         if self.type == 'memory':
@@ -62,6 +66,16 @@ class DispatcherBase(util.ConfigurableObject):
         self.config.destination.set_final_filename(
             config.pop('destination', 'output.hdf5'),# optional 'output.hdf5' by default
             util.parse_bool(config.pop('overwrite', 'false')))#by default: numbered files in the form output_###.hdf5:
+        self.config.destination.fileoptions = dict(
+            pyramid=int(config.pop('pyramid', 0)),# optional number of 2x coarser copies stored in the output file for quick browsing, 0 by default
+            projections=util.parse_bool(config.pop('projections', 'false')),# optionally, also store the projections onto every axis and pair of axes in the output file for quick previews
+            chunks=config.pop('chunks', 'auto'),# HDF5 chunk shape: auto, comma separated chunk lengths, or an axis label to optimize reading slices along that axis
+            compression=config.pop('compression', 'gzip'),# none, lzf, gzip or gzip:<level>, optionally followed by ',shuffle'
+            threads=int(config.pop('writethreads', 1)) or multiprocessing.cpu_count())# optionally, number of threads compressing the output file, 0 to autodetect (1 by default)
+        try:
+            space.compression_options(self.config.destination.fileoptions['compression'])
+        except ValueError as e:
+            raise errors.ConfigError('invalid compression specification in {0}: {1}'.format(self.__class__.__name__, e))
 
     def has_specific_task(self):
         return False
@@ -72,6 +86,19 @@ class DispatcherBase(util.ConfigurableObject):
     def sum(self, results):
         raise NotImplementedError
 
+    ### UTILITY
+    splitfactor = 4 # jobs heavier than 1/splitfactor of the work per worker are split, see schedule()
+
+    def schedule(self, jobs, workers):
+        """Returns the jobs ordered by decreasing weight (longest processing time first), such that workers taking
+        jobs from a queue finish at about the same time. Jobs heavier than 1/splitfactor of the total weight per worker
+        are split first, see backend.InputBase.split_job(), so a single large job cannot keep one worker busy at the end."""
+        jobs = list(jobs)
+        target_weight = float(sum(job.weight for job in jobs)) / (workers * self.splitfactor)
+        if target_weight > 0:
+            jobs = [part for job in jobs for part in (self.main.input.split_job(job, target_weight) if job.weight > 1.4 * target_weight else [job])]
+        return sorted(jobs, key=lambda job: job.weight, reverse=True)
+
 
 # The simplest possible dispatcher. Does the work all by itself on a single
 # thread/core/node. 'Local' will most likely suit your needs better.
@@ -104,46 +131,128 @@ class ReentrantBase(DispatcherBase):
         raise NotImplementedError
 
 
+# Process jobs in threads of the main process, all adding to one shared Space. Needs a single copy of the output
+# instead of one per core like Local, but only the parts that release the GIL (numpy, reading files) run in parallel.
+class Threaded(DispatcherBase):
+    def parse_config(self, config):
+        super(Threaded, self).parse_config(config)
+        self.config.ncores = int(config.pop('ncores', 0))# optionally, specify number of threads (autodetect by default)
+        if self.config.ncores <= 0:
+            self.config.ncores = multiprocessing.cpu_count()
+
+    def process_jobs(self, jobs):
+        jobqueue = Queue.Queue()
+        for job in self.schedule(jobs, self.config.ncores):
+            jobqueue.put(job)
+        binner = self.main.get_binner() # shared by all threads, the output is allocated only once
+        lock = threading.Lock()
+        state = {'error': None}
+
+        def work(worker): # every thread has its own projection and input, only the binning is serialized
+            try:
+                while state['error'] is None:
+                    try:
+                        job = jobqueue.get_nowait()
+                    except Queue.Empty:
+                        return
+                    for coordinates, intensity in worker.images(job):
+                        with lock:
+                            binner.add(coordinates, intensity)
+                        if state['error'] is not None:
+                            return
+            except Exception:
+                state['error'] = sys.exc_info()
+
+        threads = [threading.Thread(target=work, args=(self.main.get_worker(),)) for i in range(self.config.ncores)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1) # a plain join() cannot be interrupted by ctrl-c
+        if state['error'] is not None:
+            binner.discard() # removes the scratch file of a partial HDF5Space result
+            raise state['error'][0], state['error'][1], state['error'][2]
+        result = binner.result()
+        if not isinstance(result, space.EmptySpace):
+            yield result
+
+    def sum(self, results):
+        return next(iter(results), space.EmptySpace()) # already summed, avoid copying the output
+
+
 # Dispatch multiple worker processes locally, while doing the summation in the main process
 class Local(ReentrantBase):
-    ### OFFICIAL API
-    actions = 'user', 'job'
+    polltime = 1 # seconds between checks for workers that died without reporting
 
+    ### OFFICIAL API
     def parse_config(self, config):
         super(Local, self).parse_config(config)
         self.config.ncores = int(config.pop('ncores', 0))# optionally, specify number of cores (autodetect by default)
         if self.config.ncores <= 0:
             self.config.ncores = multiprocessing.cpu_count()
+        self.config.workermemory = util.parse_bytes(config.pop('workermemory', '0'))# optionally, send the partial sum of a worker to the main process when it needs more memory than this, e.g. 2GB (no limit by default)
+        transfer = config.pop('transfer', 'pipe')# how workers send their results: pickled through a pipe, or 'shared' to pass dense results in shared memory, or shared:<directory> for memory-mapped files in directory
+        if transfer == 'pipe':
+            self.config.transfer = False
+        elif transfer == 'shared':
+            self.config.transfer = True
+        elif transfer.startswith('shared:') and os.path.isdir(transfer[7:]):
+            self.config.transfer = transfer[7:]
+        else:
+            raise errors.ConfigError("invalid transfer specification in {0}: expected 'pipe', 'shared' or 'shared:<existing directory>', got '{1}'".format(self.__class__.__name__, transfer))
 
     def process_jobs(self, jobs):
-        if self.config.ncores == 1: # note: SingleCore will be marginally faster
-            imap = itertools.imap
-        else:
-            pool = multiprocessing.Pool(self.config.ncores)
-            imap = pool.imap_unordered
+        if self.config.ncores == 1:
+            for job in jobs:
+                yield self.main.process_job(job)
+            return
 
-        configs = (self.prepare_config(job) for job in jobs)
-        for result in imap(self.main.get_reentrant(), configs):
-            yield result
+        # the configuration is sent once, every worker builds the projection and input once and then only
+        # receives jobs. It sums the results of its jobs and only sends the sum, the main process sums ncores spaces
+        # main imports this module (through backend), so the worker function is taken from self.main instead of importing main here
+        target = self.main.get_reentrant()
+        jobs = self.schedule(jobs, self.config.ncores)
+        config = self.main.clone_config()
+        jobqueue = multiprocessing.Queue()
+        resultqueue = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=target, args=(config, jobqueue, resultqueue, self.config.workermemory, self.config.transfer)) for i in range(self.config.ncores)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        try:
+            for job in jobs:
+                jobqueue.put(job)
+            for worker in workers:
+                jobqueue.put(None)
+            running = len(workers)
+            while running:
+                try:
+                    result = resultqueue.get(timeout=self.polltime)
+                except Queue.Empty:
+                    # a worker that is killed, e.g. by the OOM killer, cannot report, the main process would wait forever
+                    for worker in workers:
+                        if not worker.is_alive() and worker.exitcode:
+                            raise errors.SubprocessError('worker process {0} died without reporting (exit code {1})'.format(worker.pid, worker.exitcode))
+                    continue
+                if result is None:
+                    running -= 1
+                elif isinstance(result, errors.SubprocessError):
+                    raise result
+                elif isinstance(result, space.SharedSpace):
+                    yield result.load()
+                else:
+                    yield result
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
 
     def sum(self, results):
         return space.chunked_sum(results)
 
-    def run_specific_task(self, command):
-        if command:
-            raise errors.SubprocessError("invalid command, too many parameters: '{0}'".format(command))
-        if self.config.action == 'job':
-            result = self.main.process_job(self.config.job)
-            self.config.destination.store(result)
-
-    ### UTILITY
-    def prepare_config(self, job):
-        config = self.main.clone_config()
-        config.dispatcher.destination.set_memory()
-        config.dispatcher.action = 'job'
-        config.dispatcher.job = job
-        return config, ()
-
 
 # Dispatch many worker processes on an Oar cluster.
 class Oar(ReentrantBase):
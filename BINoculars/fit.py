@@ -33,7 +33,7 @@ class FitBase(object):
         cydata = ydata.compressed()
         imask = ~ydata.mask
         xdata = space.get_grid()
-        cxdata = tuple(d[imask] for d in xdata)
+        cxdata = xdata.select(imask)
         return xdata, ydata, cxdata, cydata
 
     def _guess(self):
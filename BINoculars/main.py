@@ -1,6 +1,9 @@
 import os
 import sys
+import signal
 import argparse
+import traceback
+import numpy
 
 from . import space, backend, util, errors
 
@@ -20,9 +23,45 @@ def parse_commandline_config_option(s):
     return section, option, value
 
 
-def multiprocessing_main((config, command)): # note the double parenthesis for map() convenience
-    Main.from_object(config, command)
-    return config.dispatcher.destination.retrieve()
+def multiprocessing_worker(config, jobs, results, maxmemory=0, shared=False):
+    """Worker process of the Local dispatcher. Builds the projection and input from config (see Main.clone_config())
+    once, then processes the backend.Job instances taken from the jobs queue until it receives None, keeping a
+    running sum of the results. The sum is put on the results queue at the end, or as soon as it needs more than
+    maxmemory bytes (0 for no limit), followed by None. An error is put on the results queue as a SubprocessError.
+
+    With shared, a dense sum is sent as a space.SharedSpace instead, shared can also be the directory to use.
+
+    The scratch files of space.HDF5Space results are removed when the worker fails or is terminated."""
+    def send(result):
+        if isinstance(result, space.Accumulator):
+            result = result.compact()
+        if shared and result.__class__ is space.Space:
+            result = space.SharedSpace(result, None if shared is True else shared)
+        if isinstance(result, space.HDF5Space):
+            space.HDF5Space.instances.discard(result) # the scratch file is handed over to the main process
+        results.put(result)
+
+    signal.signal(signal.SIGTERM, terminate_worker)
+    try:
+        worker = Worker(config)
+        result = space.EmptySpace()
+        for job in iter(jobs.get, None):
+            result = space.accumulate(result, worker.process_job(job))
+            if maxmemory and result.memory_size > maxmemory:
+                send(result)
+                result = space.EmptySpace()
+        if not isinstance(result, space.EmptySpace):
+            send(result)
+    except Exception:
+        space.close_scratch_spaces() # the partial result and the unfinished job, before the dispatcher terminates this process
+        results.put(errors.SubprocessError('worker process {0} failed:\n{1}'.format(os.getpid(), traceback.format_exc())))
+    except SystemExit:
+        space.close_scratch_spaces()
+        raise
+    results.put(None)
+
+def terminate_worker(signum, frame):
+    sys.exit(1) # raises SystemExit in the worker process, see multiprocessing_worker()
 
 class Main(object):
     def __init__(self, config, command):
@@ -70,6 +109,11 @@ class Main(object):
             self.dispatcher.run_specific_task(command)
         else:
             jobs = self.input.generate_jobs(command)
+            if self.projection.config.limits == 'auto':
+                jobs = list(jobs)
+                self.projection.config.axes = self.plan(jobs)
+            self.check_memory()
+            self.check_layout()
             tokens = self.dispatcher.process_jobs(jobs)
             self.result = self.dispatcher.sum(tokens)
             if self.result is True:
@@ -80,14 +124,67 @@ class Main(object):
                 self.dispatcher.config.destination.store(self.result)
 
             
+    def plan(self, jobs):
+        """Planning pass, returns the Axes covering the projected data of all jobs, see InputBase.plan_job()."""
+        res = self.projection.config.resolution
+        labels = self.projection.get_axis_labels()
+        bounds = None
+        for job in jobs:
+            for intensity, params in self.input.plan_job(job):
+                coords = tuple(coord[numpy.isfinite(coord)] for coord in self.projection.project(*params))
+                if not all(coord.size for coord in coords):
+                    continue
+                imagebounds = tuple((coord.min(), coord.max()) for coord in coords)
+                if bounds is None:
+                    bounds = imagebounds
+                else:
+                    bounds = tuple((min(lo, ilo), max(hi, ihi)) for (lo, hi), (ilo, ihi) in zip(bounds, imagebounds))
+        if bounds is None:
+            return None
+        return space.Axes(space.Axis(lo, hi, r, label) for (lo, hi), r, label in zip(bounds, res, labels))
+
+    def get_axes(self):
+        """Returns the output Axes if known before processing, from the planning pass or fully bounded limits, or None."""
+        if self.projection.config.limits == 'auto':
+            return self.projection.config.axes
+        elif self.projection.config.limits is not None:
+            return space.limit_axes(self.projection.config.limits, self.projection.config.resolution, self.projection.get_axis_labels())
+
+    def check_memory(self):
+        axes = self.get_axes()
+        if axes is None or not self.projection.config.maxmemory or self.projection.config.storage != 'dense':
+            return
+        size = axes.npoints * sum(dtype.itemsize for dtype in space.get_dtype(self.projection.config.dtype))
+        if size > self.projection.config.maxmemory:
+            raise errors.ConfigError('output of {0} needs more memory than the maxmemory of {1}'.format(util.format_bytes(size), util.format_bytes(self.projection.config.maxmemory)))
+
+    def check_layout(self):
+        """Validate the HDF5 chunks option of the dispatcher against the projection axes before processing."""
+        axes = space.Axes(space.Axis(0, 0, 1, label) for label in self.projection.get_axis_labels())
+        try:
+            space.dataset_layout(axes, self.dispatcher.config.destination.fileoptions.get('chunks'))
+        except ValueError as e:
+            raise errors.ConfigError('invalid chunks specification in {0}: {1}'.format(self.dispatcher.__class__.__name__, e))
+
+    def images(self, job):
+        """Yields the (coordinates, intensity) of every image of job, see space.ImageBinner.add()."""
+        for intensity, params in self.input.process_job(job):
+            yield self.projection.project(*params), intensity
+
+    def get_binner(self):
+        """Returns an empty space.ImageBinner for the output described by the projection config."""
+        res = self.projection.config.resolution
+        labels = self.projection.get_axis_labels()
+        cls = space.storage_classes[self.projection.config.storage]
+        if self.projection.config.limits == 'auto':
+            return space.ImageBinner(res, labels, axes=self.projection.config.axes, cls=cls, dtype=self.projection.config.dtype)
+        return space.ImageBinner(res, labels, limits=self.projection.config.limits, cls=cls, dtype=self.projection.config.dtype)
+
     def process_job(self, job):
-        def generator():
-            res = self.projection.config.resolution
-            labels = self.projection.get_axis_labels()
-            for intensity, params in self.input.process_job(job):
-                coords = self.projection.project(*params)
-                yield space.Space.from_image(res, labels, coords, intensity)
-        return space.chunked_sum(generator(), chunksize=25)
+        binner = self.get_binner()
+        for coordinates, intensity in self.images(job):
+            binner.add(coordinates, intensity)
+        return binner.result()
 
     def clone_config(self):
         config = util.ConfigSectionGroup()
@@ -98,7 +195,17 @@ class Main(object):
         return config
 
     def get_reentrant(self):
-        return multiprocessing_main
+        return multiprocessing_worker
+
+    def get_worker(self):
+        """Returns a new Worker with its own projection and input, e.g. for a thread of the Threaded dispatcher."""
+        return Worker(self.clone_config())
+
+class Worker(Main): # only the projection and input, built once per worker process, see multiprocessing_worker()
+    def __init__(self, config):
+        self.config = config.configfile
+        self.projection = backend.get_projection(config.projection)
+        self.input = backend.get_input(config.input)
 
 class Split(Main): #completely ignores the dispatcher, just yields a space per image
     def __init__(self, config, command):
@@ -78,6 +78,15 @@ class DraggableColorbar(object):
 
 
 def get_clipped_norm(data, clipping=0.0, log=True):
+    if hasattr(data, 'quantile'): # space.Statistics stored with the data, no need to look at the data itself
+        vmin, vmax = data.quantile(clipping, positive=log), data.quantile(1 - clipping, positive=log)
+        if vmin is None:
+            return matplotlib.colors.LogNorm(1, 10) if log else matplotlib.colors.Normalize(0, 1)
+        if log:
+            return matplotlib.colors.LogNorm(vmin, vmax)
+        else:
+            return matplotlib.colors.Normalize(vmin, vmax)
+
     if hasattr(data, 'compressed'):
         data = data.compressed()
     else:
@@ -90,8 +99,7 @@ def get_clipped_norm(data, clipping=0.0, log=True):
 
     if clipping:
         chop = int(round(data.size * clipping))
-        clip = sorted(data)[chop:-(1+chop)]
-        vmin, vmax = clip[0], clip[-1]
+        vmin, vmax = numpy.partition(data, (chop, data.size - 2 - chop))[[chop, data.size - 2 - chop]] # as sorted(data)[chop:-(1+chop)]
     else:
         vmin, vmax = data.min(), data.max()
         
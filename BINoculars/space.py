@@ -1,5 +1,12 @@
+import os
+import zlib
+import atexit
+import weakref
 import itertools
 import numbers
+import tempfile
+import multiprocessing.pool
+import collections
 import __builtin__
 import numpy
 import h5py
@@ -20,6 +27,31 @@ def sum_onto(a, axis):
     return a
 
 
+def get_dtype(dtype=None):
+    """Returns the numpy dtypes of photons and contributions as a 2-tuple. dtype is either None
+    for the defaults (float64, uint32) or a 2-tuple of a floating point and an (unsigned) integer type."""
+    if dtype is None:
+        return numpy.dtype(numpy.float64), numpy.dtype(numpy.uint32)
+    photons, contributions = (numpy.dtype(d) for d in dtype)
+    if photons.kind != 'f':
+        raise ValueError('photons should have a floating point type, got {0}'.format(photons))
+    if contributions.kind not in 'ui':
+        raise ValueError('contributions should have an (unsigned) integer type, got {0}'.format(contributions))
+    return photons, contributions
+
+def common_dtype(a, b):
+    """Returns the (photons, contributions) dtypes that can hold the data of both dtype 2-tuples."""
+    return tuple(numpy.promote_types(x, y) for x, y in zip(get_dtype(a), get_dtype(b)))
+
+def promote_contributions(dtype, maximum):
+    """Returns the narrowest unsigned integer dtype, at least as wide as dtype, that can hold maximum."""
+    for candidate in (dtype, numpy.uint16, numpy.uint32, numpy.uint64):
+        candidate = numpy.dtype(candidate)
+        if candidate.itemsize >= dtype.itemsize and numpy.iinfo(candidate).max >= maximum:
+            return candidate
+    return numpy.dtype(numpy.uint64)
+
+
 class Axis(object):
     """Represents a single dimension finite discrete grid centered at 0.
 
@@ -139,9 +171,15 @@ class Axis(object):
         return self.__class__(min, max, self.res, self.label)
 
     def rebin(self, factor):
+        """Returns (left, right, new Axis), grid index i ends up in bin rebin_index(i, factor) of the new Axis.
+        left and right are the number of empty grid points to add such that the new bins are filled exactly."""
         # for integers the following relations hold: a // b == floor(a / b), -(-a // b) == ceil(a / b)
-        new = self.__class__(self.imin // factor, -(-self.imax  // factor), factor*self.res, self.label)
-        return self.imin % factor, -self.imax % factor, new
+        if factor % 2:
+            new = self.__class__(rebin_index(self.imin, factor), rebin_index(self.imax, factor), factor*self.res, self.label)
+        else:
+            new = self.__class__(self.imin // factor, -(-self.imax  // factor), factor*self.res, self.label)
+        left = self.imin - (new.imin * factor - rebin_shift(factor))
+        return left, len(new) * factor - left - len(self), new
 
     def __repr__(self):
         return '{0.__class__.__name__} {0.label} (min={0.min}, max={0.max}, res={0.res}, count={1})'.format(self, len(self))
@@ -190,6 +228,10 @@ class Axes(object):
     def npoints(self):
         return numpy.array([len(ax) for ax in self.axes]).prod()
 
+    @property
+    def shape(self):
+        return tuple(len(ax) for ax in self.axes)
+
     @property
     def memory_size(self):
         # assuming double precision floats for photons, 32 bit integers for contributions
@@ -274,6 +316,178 @@ class Axes(object):
             raise IndexError('dimension mismatch')
 
 
+class Grid(tuple):
+    """Data coordinates of each grid point, like numpy.mgrid() in data coordinates, without the memory.
+
+    A Grid is an n-tuple of n-dimensional read-only arrays that are broadcast from one coordinate
+    vector per axis, so they can be indexed, sliced and used in arithmetic like the full arrays.
+
+    Important attributes:
+        vectors     n-tuple of the coordinate vectors, shaped to broadcast against each other (open grid)"""
+
+    def __new__(cls, axes):
+        vectors = []
+        for i, ax in enumerate(axes):
+            shape = [1] * len(axes)
+            shape[i] = len(ax)
+            vectors.append(((numpy.arange(len(ax)) + ax.imin) * ax.res).reshape(shape))
+        arrays = numpy.broadcast_arrays(*vectors)
+        for array in arrays:
+            array.flags.writeable = False
+        grid = super(Grid, cls).__new__(cls, arrays)
+        grid.vectors = tuple(vectors)
+        return grid
+
+    def select(self, mask, key=None):
+        """Returns the coordinates of the grid points where the boolean array mask is True, as n-tuple of 1D arrays.
+        With key (an n-tuple of slices), mask covers only that block of the grid."""
+        vectors = self.vectors if key is None else self.block(key)
+        return tuple(vector.ravel()[index] for vector, index in zip(vectors, numpy.nonzero(mask)))
+
+    def block(self, key):
+        """Returns the coordinate vectors of a block of the grid, key is an n-tuple of slices."""
+        return tuple(vector[(slice(None),) * i + (k,)] for i, (vector, k) in enumerate(zip(self.vectors, key)))
+
+
+class Statistics(object):
+    """Summary of the data of a Space, stored in the HDF5 file by tofile() such that info, trimming and
+    color scaling do not have to read the data.
+
+    Important attributes:
+        bounds          n-tuple of (first, last) grid indices of the points with contributions per axis, None without data
+        photons         total number of photons
+        contributions   total number of contributions
+        npoints         number of grid points with contributions
+        min, max        smallest and largest intensity (photons / contributions) of these grid points
+        minpositive     smallest positive intensity, None if there is none
+        nonpositive     number of these grid points with an intensity <= 0
+        histogram       number of points with a positive intensity per bin of histogram_edges, see quantile()"""
+
+    histogram_edges = 10. ** numpy.linspace(-15, 15, 30 * 20 + 1) # 20 bins per decade
+
+    def __init__(self, dimension):
+        self.bounds = None
+        self.photons = 0.
+        self.contributions = 0
+        self.npoints = 0
+        self.min = self.max = self.minpositive = None
+        self.nonpositive = 0
+        self.histogram = numpy.zeros(len(self.histogram_edges) - 1, dtype=numpy.int64)
+        self._lower = [None] * dimension
+        self._upper = [None] * dimension
+
+    @classmethod
+    def fromspace(cls, space, blocksize=2**20):
+        """Compute the statistics of a Space, one block of about blocksize grid points at a time."""
+        statistics = cls(space.dimension)
+        for key, photons, contributions in space._data_blocks(blocksize):
+            statistics.add_block(key, photons, contributions)
+        return statistics
+
+    def add_block(self, key, photons, contributions):
+        """Include the data of a block, key is the index key of its position on the grid (a tuple of slices)."""
+        self.photons += float(photons.sum(dtype=numpy.float64))
+        self.contributions += int(contributions.sum(dtype=numpy.uint64))
+        mask = contributions > 0
+        if not mask.any():
+            return
+        for i, k in enumerate(key):
+            nonzero = numpy.flatnonzero(mask.any(axis=tuple(j for j in range(mask.ndim) if j != i)))
+            lower, upper = k.start + int(nonzero[0]), k.start + int(nonzero[-1])
+            self._lower[i] = lower if self._lower[i] is None else min(self._lower[i], lower)
+            self._upper[i] = upper if self._upper[i] is None else max(self._upper[i], upper)
+        self.bounds = tuple(zip(self._lower, self._upper))
+
+        intensity = photons[mask] / contributions[mask]
+        intensity = intensity[numpy.isfinite(intensity)]
+        if not intensity.size:
+            return
+        self.npoints += intensity.size
+        self.min = float(intensity.min()) if self.min is None else min(self.min, float(intensity.min()))
+        self.max = float(intensity.max()) if self.max is None else max(self.max, float(intensity.max()))
+        positive = intensity[intensity > 0]
+        self.nonpositive += intensity.size - positive.size
+        if positive.size:
+            self.minpositive = float(positive.min()) if self.minpositive is None else min(self.minpositive, float(positive.min()))
+            edges = self.histogram_edges
+            self.histogram += numpy.histogram(numpy.clip(positive, edges[0], edges[-1]), edges)[0]
+
+    def quantile(self, q, positive=False):
+        """Returns the (approximate) intensity below which a fraction q of the grid points with contributions falls.
+        With positive, only points with a positive intensity are considered. The histogram has 20 bins per decade,
+        points with an intensity <= 0 are counted at min."""
+        total = self.histogram.sum() + (0 if positive else self.nonpositive)
+        if not total:
+            return None
+        target = q * total
+        if not positive:
+            if target < self.nonpositive:
+                return self.min
+            target -= self.nonpositive
+        cumulative = numpy.cumsum(self.histogram)
+        i = min(int(numpy.searchsorted(cumulative, target, side='right')), len(cumulative) - 1)
+        before = cumulative[i - 1] if i else 0
+        fraction = (target - before) / float(self.histogram[i]) if self.histogram[i] else 0.
+        lo, hi = self.histogram_edges[i], self.histogram_edges[i + 1]
+        return float(min(max(lo * (hi / lo) ** fraction, self.minpositive), self.max))
+
+    def tofile(self, group):
+        """Store the statistics in the 'statistics' subgroup of the open HDF5 group."""
+        if 'statistics' in group:
+            del group['statistics']
+        stats = group.create_group('statistics')
+        stats.create_dataset('bounds', data=numpy.array(self.bounds if self.bounds is not None else [(-1, -1)] * len(self._lower), dtype=int))
+        stats.create_dataset('histogram', data=self.histogram)
+        stats.create_dataset('histogram_edges', data=self.histogram_edges)
+        for name in ('photons', 'contributions', 'npoints', 'nonpositive', 'min', 'max', 'minpositive'):
+            value = getattr(self, name)
+            if value is not None:
+                stats.attrs[name] = value
+
+    @classmethod
+    def fromfile(cls, file, project=(), compute=True):
+        """Load the statistics of a Space from an HDF5 file.
+
+        file      filename string or h5py.File instance
+        project   optional axes, the statistics of the projection onto these axes, see Space.fromfile()
+        compute   if the file has no statistics for this data, e.g. when it was written by an older version,
+                  compute them by reading the data one block at a time, otherwise return None"""
+        try:
+            with util.open_h5py(file, 'r') as fp:
+                group = projection_group(fp, None, project)[0] if project else fp
+                if group is not None and 'statistics' in group:
+                    stats = group['statistics']
+                    new = cls(len(stats['bounds']))
+                    bounds = stats['bounds'][...]
+                    if (bounds >= 0).all():
+                        new.bounds = tuple((int(lower), int(upper)) for lower, upper in bounds)
+                    new.histogram = stats['histogram'][...]
+                    new.histogram_edges = stats['histogram_edges'][...]
+                    for name in ('photons', 'contributions', 'npoints', 'nonpositive', 'min', 'max', 'minpositive'):
+                        if name in stats.attrs:
+                            setattr(new, name, stats.attrs[name].item())
+                    return new
+                if not compute:
+                    return None
+                if project:
+                    return cls.fromspace(Space.fromfile(fp, project=project))
+                axes = Axes.fromfile(fp)
+                new = cls(len(axes))
+                counts, contributions = fp['counts'], fp['contributions']
+                for key in chunk_keys(counts.shape, block_shape(counts, counts.shape)):
+                    new.add_block(key, counts[key], contributions[key])
+                return new
+        except IOError as e:
+            raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(file, e))
+        except KeyError as e:
+            raise errors.HDF5FileError('unable to load statistics from HDF5 file {0}, is it a valid BINoculars file? (original error: {1!r})'.format(file, e))
+
+    def __repr__(self):
+        if self.bounds is None:
+            return '{0.__class__.__name__} (no data)'.format(self)
+        return '{0.__class__.__name__} ({0.npoints} points with data, {0.photons:g} photons, {0.contributions} contributions, intensity {0.min:g} to {0.max:g})'.format(self)
+
+
 class EmptySpace(object):
     """Convenience object for sum() and friends. Treated as zero for addition.
     Does not share a base class with Space for simplicity."""
@@ -304,9 +518,12 @@ class Space(object):
         axes             Axes instances describing range and stepsizes of each of the dimensions
         photons          n-dimension numpy float array, total intensity per grid point
         contribitions    n-dimensional numpy integer array, number of original datapoints (pixels) per grid point
-        dimension        n"""
+        dimension        n
+
+    The dtype argument selects the precision of photons and contributions, see get_dtype().
+    Contributions narrower than 32 bits are promoted to a wider type when they would overflow."""
 
-    def __init__(self, axes, config=None):
+    def __init__(self, axes, config=None, dtype=None):
         if not isinstance(axes, Axes):
             self.axes = Axes(axes)
         else:
@@ -314,8 +531,9 @@ class Space(object):
 
         self.config = config
         
-        self.photons = numpy.zeros([len(ax) for ax in self.axes], order='C')
-        self.contributions = numpy.zeros(self.photons.shape, dtype=numpy.uint32, order='C')
+        photons_dtype, contributions_dtype = get_dtype(dtype)
+        self.photons = numpy.zeros([len(ax) for ax in self.axes], dtype=photons_dtype, order='C')
+        self.contributions = numpy.zeros(self.photons.shape, dtype=contributions_dtype, order='C')
 
     @property
     def dimension(self):
@@ -325,6 +543,31 @@ class Space(object):
     def npoints(self):
         return self.photons.size
 
+    @property
+    def dtype(self):
+        """2-tuple of the numpy dtypes of photons and contributions"""
+        return self.photons.dtype, self.contributions.dtype
+
+    def _promote_contributions(self, extra, region=None):
+        """Widen contributions if adding up to extra (a number or a Space) per grid point could overflow.
+        Only types narrower than 32 bits are checked. region is the part of contributions that receives
+        extra, only its maximum is computed (by default that of the entire Space)."""
+        dtype = self.dtype[1]
+        if dtype.itemsize >= 4:
+            return
+        if isinstance(extra, Space):
+            extra = extra._contributions_max()
+        current = self._contributions_max() if region is None else (region.max() if region.size else 0)
+        newdtype = promote_contributions(dtype, int(current) + int(extra))
+        if newdtype != dtype:
+            self._convert_contributions(newdtype)
+
+    def _contributions_max(self):
+        return self.contributions.max() if self.npoints else 0
+
+    def _convert_contributions(self, dtype):
+        self.contributions = self.contributions.astype(dtype)
+
     @property
     def memory_size(self):
         """Returns approximate memory consumption of this Space.
@@ -347,7 +590,7 @@ class Space(object):
 
     def copy(self):
         """Returns a copy of self. Numpy data is not shared, but the Axes object is."""
-        new = self.__class__(self.axes, self.config)
+        new = self.__class__(self.axes, self.config, self.dtype)
         new.photons[:] = self.photons
         new.contributions[:] = self.contributions
         return new
@@ -432,10 +675,8 @@ class Space(object):
         
     def get_grid(self):
         """Returns the data coordinates of each grid point, as n-tuple of n-dimensinonal arrays.
-        Basically numpy.mgrid() in data coordinates."""
-        igrid = numpy.mgrid[tuple(slice(0, len(ax)) for ax in self.axes)]
-        grid = tuple(numpy.array((grid + ax.imin) * ax.res) for grid, ax in zip(igrid, self.axes))
-        return grid
+        Basically numpy.mgrid() in data coordinates, but lazy, see Grid."""
+        return Grid(self.axes)
 
     def max(self, axis=None):
         """Returns maximum intensity."""
@@ -456,7 +697,7 @@ class Space(object):
         if not len(self.axes) == len(other.axes) or not all(a.is_compatible(b) for (a, b) in zip(self.axes, other.axes)):
             raise ValueError('cannot add spaces with different dimensionality or resolution')
 
-        new = self.__class__([a | b for (a, b) in zip(self.axes, other.axes)])
+        new = self.__class__([a | b for (a, b) in zip(self.axes, other.axes)], dtype=common_dtype(self.dtype, other.dtype))
         new += self
         new += other
         return new
@@ -474,8 +715,9 @@ class Space(object):
             return self.__add__(other)
 
         index = tuple(slice(self_ax.get_index(other_ax.min), self_ax.get_index(other_ax.min) + len(other_ax)) for (self_ax, other_ax) in zip(self.axes, other.axes))
+        self._promote_contributions(other, self.contributions[index])
         self.photons[index] += other.photons
-        self.contributions[index] += other.contributions
+        numpy.add(self.contributions[index], other.contributions, out=self.contributions[index], casting='unsafe')
         return self
 
     def __sub__(self, other):
@@ -523,46 +765,40 @@ class Space(object):
     def rebin(self, factors):
         """Increase bin size (= decrease resolution).
 
-        factor   even integer or n-tuple of even integers"""
-        if isinstance(factors, int):
-            factors = [factors] * len(self.axes)
-        elif len(factors) != len(self.axes):
-            raise ValueError('dimension mismatch between factors and axes')
-        if not all(isinstance(factor, int) for factor in factors) or not all(factor == 1 or factor % 2 == 0 for factor in factors):
-            raise ValueError('binning factors must be even integers')
-
+        factor   positive integer or n-tuple of positive integers, odd factors keep
+                 the new bins centered on the old ones, see Axis.rebin()"""
+        factors = rebin_factors(factors, len(self.axes))
         lefts, rights, newaxes = zip(*[ax.rebin(factor) for ax, factor in zip(self.axes, factors)])
-        tempshape = tuple(size + left + right + factor for size, left, right, factor in zip(self.photons.shape, lefts, rights, factors))
-
-        photons = numpy.zeros(tempshape, order='C')
-        contributions = numpy.zeros(tempshape, dtype=numpy.uint32, order='C')
-        pad = tuple(slice(left, left+size) for left, factor, size in zip(lefts, factors, self.photons.shape))
-        photons[pad] = self.photons
-        contributions[pad] = self.contributions
-
-        new = self.__class__(newaxes)
-        for offsets in itertools.product(*[range(factor) for factor in factors]):
-            stride = tuple(slice(offset, offset + len(ax)*factor, factor) for offset, ax, factor in zip(offsets, newaxes, factors))
-            new.photons += photons[stride]
-            new.contributions += contributions[stride]
+        dtype = self._rebin_dtype(factors)
 
+        new = self.__class__(newaxes, dtype=dtype)
+        new.photons = rebin_array(self.photons, lefts, factors, new.axes.shape, dtype[0])
+        new.contributions = rebin_array(self.contributions, lefts, factors, new.axes.shape, dtype[1])
         return new
 
+    def _rebin_dtype(self, factors):
+        photons_dtype, contributions_dtype = self.dtype
+        if contributions_dtype.itemsize < 4:
+            contributions_dtype = promote_contributions(contributions_dtype, int(self._contributions_max()) * numpy.prod(factors))
+        return photons_dtype, contributions_dtype
+
     def rebin2(self, resolutions):
         """Change bin size.
     
-        resolution    n-tuple of floats, new resolution of each axis"""
+        resolution    n-tuple of floats, new resolution of each axis
+
+        Every grid point is moved to the nearest grid point of the new resolution. As this
+        is separable, it is done one axis at a time, without computing the coordinate grid."""
         if not len(resolutions) == len(self.axes):
             raise ValueError('cannot rebin space with different dimensionality compatible')
-        labels = tuple(ax.label for ax in self.axes)
-        coordinates = tuple(grid.flatten() for grid in self.get_grid())
-
-        contribution_space = self.from_image(resolutions, labels, coordinates, self.contributions.flatten())
-        contributions = contribution_space.photons.astype(int)
-        del contribution_space
-
-        new = self.from_image(resolutions, labels, coordinates, self.photons.flatten())
-        new.contributions = contributions
+        newaxes, maps = resample_maps(self.axes, resolutions)
+        contributions, origin = resample_array(self.contributions, maps, numpy.uint64)
+        dtype = self.dtype[0], promote_contributions(self.dtype[1], contributions.max() if contributions.size else 0)
+
+        new = self.__class__(newaxes, dtype=dtype)
+        key = tuple(slice(start, start + size) for start, size in zip(origin, contributions.shape))
+        new.photons[key] = resample_array(self.photons, maps)[0]
+        new.contributions[key] = contributions
         return new
 
     def make_compatible(self, other):
@@ -596,74 +832,1026 @@ class Space(object):
         return new
 
                          
-    def transform_coordinates(self, resolutions, labels, transformation):
-        # gather data and transform
-        intensity = self.get_masked()
-        coords = self.get_grid()
-        transcoords = transformation(*coords)
-
-        # get rid of invalids & masked intensities
-        valid = ~__builtin__.sum((~numpy.isfinite(t) for t in transcoords), intensity.mask)
-        transcoords = tuple(t[valid] for t in transcoords)
-
-        return self.from_image(resolutions, labels, transcoords, intensity[valid])
+    transform_blocksize = 2**20 # grid points
+
+    def transform_coordinates(self, resolutions, labels, transformation, blocksize=None, threads=1):
+        """Bin the data on new axes, computed from the data coordinates by transformation.
+
+        resolutions     n-tuple of resolutions of the new axes
+        labels          n-tuple of labels of the new axes
+        transformation  function of the coordinate arrays of the current axes, returning those of the new axes
+        blocksize       number of grid points transformed at once, bounds the memory use (default: transform_blocksize)
+        threads         number of threads transforming blocks, the binning is done by the calling thread
+
+        Only the grid points with data are transformed, one block at a time, and binned into a growing
+        Accumulator. Returns a Space of the same class."""
+        resolutions, labels = tuple(resolutions), tuple(labels)
+        grid = self.get_grid()
+
+        def transform(block):
+            key, photons, contributions = block
+            mask = contributions != 0
+            intensity = photons[mask] / contributions[mask]
+            transcoords = transformation(*grid.select(mask, key))
+
+            # get rid of invalids
+            valid = numpy.ones(intensity.shape, dtype=bool)
+            for coord in transcoords:
+                valid &= numpy.isfinite(coord)
+            return tuple(coord[valid] for coord in transcoords), intensity[valid]
+
+        blocks = (block for block in self._data_blocks(blocksize or self.transform_blocksize) if block[2].any())
+        if threads > 1:
+            pool = multiprocessing.pool.ThreadPool(threads)
+            images = itertools.chain.from_iterable(pool.imap(transform, batch) for batch in util.grouper(blocks, 2 * threads))
+        else:
+            pool = None
+            images = itertools.imap(transform, blocks)
+        try:
+            return bin_images((image for image in images if image[1].size), resolutions, labels, cls=self.__class__)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _data_blocks(self, blocksize):
+        """Yields (index key, photons, contributions) of blocks of about blocksize grid points, covering the Space."""
+        shape = self.axes.shape
+        for key in chunk_keys(shape, chunk_shape(shape, blocksize)):
+            yield key, self.photons[key], self.contributions[key]
 
     def process_image(self, coordinates, intensity):
-        """Load image data into Space.
+        """Load image data into Space. Only the bounding box of the image is binned, instead of the entire grid.
 
         coordinates  n-tuple of data coordinate arrays
         intensity    data intensity array"""
         if len(coordinates) != len(self.axes):
             raise ValueError('dimension mismatch between coordinates and axes')
 
-        valid = numpy.isfinite(intensity)
-        intensity = intensity[valid]
+        coordinates, intensity = finite_data(coordinates, intensity)
         if not intensity.size:
             return
-        coordinates = tuple(coord[valid] for coord in coordinates)
-
-        indices = numpy.array(tuple(ax.get_index(coord) for (ax, coord) in zip(self.axes, coordinates)))
-        for i in range(0, len(self.axes)):
-            for j in range(i+1, len(self.axes)):
-                indices[i,:] *= len(self.axes[j])
-        indices = indices.sum(axis=0).astype(int)
-        photons = numpy.bincount(indices, weights=intensity)
-        contributions = numpy.bincount(indices)
-    
-        self.photons.ravel()[:photons.size] += photons
-        self.contributions.ravel()[:contributions.size] += contributions
+
+        boxaxes = Axes(ax.rebound(int(numpy.around(coord.min() / ax.res)), int(numpy.around(coord.max() / ax.res))) for ax, coord in zip(self.axes, coordinates))
+        if not all(box in ax for box, ax in zip(boxaxes, self.axes)):
+            flat_indices(self.axes, coordinates) # raises a ValueError describing the offending coordinates
+        flat = flat_indices(boxaxes, coordinates)
+        shape = boxaxes.shape
+        size = boxaxes.npoints
+        box = tuple(slice(box.imin - ax.imin, box.imax - ax.imin + 1) for box, ax in zip(boxaxes, self.axes))
+
+        contributions = numpy.bincount(flat, minlength=size).reshape(shape)
+        self._promote_contributions(contributions.max(), self.contributions[box])
+        self.photons[box] += numpy.bincount(flat, weights=intensity, minlength=size).reshape(shape)
+        target = self.contributions[box]
+        numpy.add(target, contributions, out=target, casting='unsafe')
+
+    def _image_indices(self, coordinates, intensity):
+        """Returns flat (C-order) grid indices and intensity of all finite pixels in an image."""
+        if len(coordinates) != len(self.axes):
+            raise ValueError('dimension mismatch between coordinates and axes')
+
+        coordinates, intensity = finite_data(coordinates, intensity)
+        if not intensity.size:
+            return numpy.zeros(0, dtype=int), intensity
+        return flat_indices(self.axes, coordinates), intensity
 
     @classmethod
-    def from_image(cls, resolutions, labels, coordinates, intensity):
+    def from_space(cls, space):
+        """Returns space as an instance of this class, converting it only if necessary."""
+        if space.__class__ is cls:
+            return space
+        new = cls(space.axes, space.config, space.dtype)
+        new += space
+        return new
+
+    @classmethod
+    def from_image(cls, resolutions, labels, coordinates, intensity, dtype=None):
         """Create Space from image data. 
 
         resolutions   n-tuple of axis resolutions
         labels          n-tuple of axis labels
         coordinates   n-tuple of data coordinate arrays
-        intensity     data intensity array"""
+        intensity     data intensity array
+        dtype         optional (photons, contributions) dtypes, see get_dtype()"""
         axes = tuple(Axis(coord.min(), coord.max(), res, label) for res, label, coord in zip(resolutions, labels, coordinates))
-        newspace = cls(axes)
+        newspace = cls(axes, dtype=dtype)
         newspace.process_image(coordinates, intensity)
         return newspace
 
-    def tofile(self, filename):
-        """Store Space in HDF5 file."""
+    def tofile(self, filename, pyramid=0, projections=False, chunks=None, compression='gzip', threads=1):
+        """Store Space in HDF5 file.
+
+        filename     output file name
+        pyramid      number of successively 2x coarser copies stored alongside the data, see fromfile()
+        projections  also store the projections onto every axis and pair of axes, see fromfile()
+        chunks       HDF5 chunk shape of the data, see dataset_layout()
+        compression  HDF5 filters, see compression_options()
+        threads      number of threads compressing the data, see write_chunks()"""
+        layout = dataset_layout(self.axes, chunks, compression)
         with util.atomic_write(filename) as tmpname:
             with util.open_h5py(tmpname, 'w') as fp:
                 self.config.tofile(fp)
                 self.axes.tofile(fp)
-                fp.create_dataset('counts', self.photons.shape, dtype=self.photons.dtype, compression='gzip').write_direct(self.photons)
-                fp.create_dataset('contributions', self.contributions.shape, dtype=self.contributions.dtype, compression='gzip').write_direct(self.contributions)
+                Statistics.fromspace(self).tofile(fp)
+                counts = fp.create_dataset('counts', self.photons.shape, dtype=self.photons.dtype, **layout)
+                contributions = fp.create_dataset('contributions', self.contributions.shape, dtype=self.contributions.dtype, **dict(layout, chunks=counts.chunks))
+                if threads > 1 and counts.chunks:
+                    blocks = ((key, (self.photons[key], self.contributions[key])) for key in chunk_keys(counts.shape, counts.chunks))
+                    write_chunks((counts, contributions), blocks, threads)
+                else:
+                    counts.write_direct(self.photons)
+                    contributions.write_direct(self.contributions)
+                write_pyramid(fp, self, pyramid, compression)
+                if projections:
+                    write_projections(fp, self, compression)
 
     @classmethod
-    def fromfile(cls, file, key=None):
+    def fromfile(cls, file, key=None, resolution=None, project=(), trim=False):
         """Load Space from HDF5 file.
 
         file      filename string or h5py.File instance
-        key       sliced (subset) loading, should be an n-tuple of slice()s in data coordinates"""
+        key       sliced (subset) loading, should be an n-tuple of slice()s in data coordinates
+        resolution  optional, load the coarsest pyramid level (see tofile()) at least this fine, a number or one per axis
+        project   optional axes to project the loaded Space on, see project(). Read from the projections
+                  stored by tofile() when key spans these axes completely and resolution selects the full
+                  resolution data, otherwise summed while reading the file chunk by chunk, such that only
+                  the projected Space has to fit in memory
+        trim      optional, trim the loaded Space like trim(). Only the bounding box of the data is read,
+                  using the statistics stored by tofile() for the full resolution data and the projections"""
         try:
             with util.open_h5py(file, 'r') as fp:
-                axes = Axes.fromfile(fp)
+                data = pyramid_level(fp, resolution)
+                if project and data is fp: # the stored projections are those of the full resolution data
+                    group, subkey = projection_group(fp, key, project)
+                    if group is not None:
+                        space = cls.fromfile(group, subkey, trim=trim)
+                        space.config = util.ConfigFile.fromfile(fp)
+                        return space
+                axes = Axes.fromfile(data)
+                config = util.ConfigFile.fromfile(fp)
+                if key:
+                    if len(axes) != len(key):
+                        raise ValueError("dimensionality of 'key' does not match dimensionality of Space in HDF5 file {0}".format(file))
+                    key = tuple(ax.get_index(k) for k, ax in zip(key, axes))
+                else:
+                    key = tuple(slice(None) for ax in axes)
+                statistics = Statistics.fromfile(data, compute=False) if trim else None
+                if statistics is not None and statistics.bounds is not None and trimmed_key(key, statistics.bounds, axes.shape):
+                    untrimmed, key = key, trimmed_key(key, statistics.bounds, axes.shape)
+                    trim = any(k != slice(None) for k in untrimmed) # the bounds are those of the full data
+                remaining = [i for i, k in enumerate(key) if isinstance(k, slice)]
+                projected = [] # the same sequence of indices as project()
+                for axis in project:
+                    projected.append(remaining.pop(Axes(axes[i][key[i]] for i in remaining).index(axis)))
+                try:
+                    photons, contributions = read_data(data, key, projected)
+                except (KeyError, TypeError) as e:
+                    raise errors.HDF5FileError('unable to load Space from HDF5 file {0}, is it a valid BINoculars file? (original error: {1!r})'.format(file, e))
+                space = cls(tuple(axes[i][key[i]] for i in remaining), config, (photons.dtype, contributions.dtype))
+                space.photons, space.contributions = photons, contributions
+        except IOError as e:
+            raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(file, e))
+        if trim and (space.contributions > 0).any():
+            space.trim()
+        return space
+
+
+class Accumulator(Space):
+    """Space that grows in place when data outside its axes is added, like a dynamic array.
+
+    The photons and contributions arrays are views into larger buffers with headroom along
+    every axis that had to grow, proportional to the length of that axis. Repeatedly growing
+    the Space, e.g. by adding image after image of a theta scan, therefore costs amortized O(1)
+    copies per addition. Use compact() to obtain a regular Space with arrays of the exact size.
+
+    Important attributes:
+        capacity         Axes instance describing the buffers, always contains axes"""
+
+    headroom = 0.5 # fraction of the axis length added on every side that needs to grow
+
+    @property
+    def photons(self):
+        return self._photons[self._view()]
+
+    @photons.setter
+    def photons(self, photons):
+        self._photons = photons
+        self.capacity = self.axes
+
+    @property
+    def contributions(self):
+        return self._contributions[self._view()]
+
+    @contributions.setter
+    def contributions(self, contributions):
+        self._contributions = contributions
+        self.capacity = self.axes
+
+    def _view(self):
+        return tuple(slice(ax.imin - cap.imin, ax.imin - cap.imin + len(ax)) for ax, cap in zip(self.axes, self.capacity))
+
+    def extend(self, axes):
+        """Grow in place such that the Space covers at least axes."""
+        newaxes = Axes(a | b for (a, b) in zip(self.axes, axes))
+        if not all(ax in cap for ax, cap in zip(newaxes, self.capacity)):
+            capacity = Axes(grow_axis(cap, ax, self.headroom) for ax, cap in zip(newaxes, self.capacity))
+            photons = numpy.zeros(capacity.shape, dtype=self._photons.dtype, order='C')
+            contributions = numpy.zeros(capacity.shape, dtype=self._contributions.dtype, order='C')
+            view = tuple(slice(ax.imin - cap.imin, ax.imin - cap.imin + len(ax)) for ax, cap in zip(self.axes, capacity))
+            photons[view] = self.photons
+            contributions[view] = self.contributions
+            self._photons, self._contributions, self.capacity = photons, contributions, capacity
+        self.axes = newaxes
+
+    def __iadd__(self, other):
+        """In-place addition, grows the Space if necessary."""
+        if isinstance(other, Space) and len(self.axes) == len(other.axes):
+            self.extend(other.axes)
+        return super(Accumulator, self).__iadd__(other)
+
+    def trim(self):
+        """Reduce total size of Space by trimming zero-contribution data points on the boundaries. Drops the headroom."""
+        new = self.compact()
+        new.trim()
+        self.axes = new.axes
+        self.photons = new.photons
+        self.contributions = new.contributions
+
+    def _convert_contributions(self, dtype):
+        self._contributions = self._contributions.astype(dtype)
+
+    def compact(self):
+        """Returns a regular Space with contiguous arrays of the exact size. Without headroom, the
+        buffers themselves are returned instead of a copy, so stop adding to the Accumulator afterwards."""
+        if self.capacity == self.axes: # skip Space.__init__, which would allocate a second output-sized buffer
+            new = Space.__new__(Space)
+            new.axes, new.config = self.axes, self.config
+            new.photons, new.contributions = self._photons, self._contributions
+        else:
+            new = Space(self.axes, self.config, self.dtype)
+            new.photons[...] = self.photons
+            new.contributions[...] = self.contributions
+        return new
+
+
+class SparseSpace(Space):
+    """Space variant for mostly empty grids, e.g. a thin rod scan over a wide L range.
+    Only grid points that received data are stored, which also makes pickling cheap.
+
+    The photons and contributions attributes are still available, but are converted to
+    dense arrays on every access: use todense() when you need them more than once.
+
+    Important attributes:
+        axes                   Axes instances describing range and stepsizes of each of the dimensions
+        indices                sorted 1D integer array, flat (C-order) grid index of every stored grid point
+        sparse_photons         1D float array, total intensity per stored grid point
+        sparse_contributions   1D integer array, number of original datapoints (pixels) per stored grid point
+        dimension              n"""
+
+    def __init__(self, axes, config=None, dtype=None):
+        if not isinstance(axes, Axes):
+            self.axes = Axes(axes)
+        else:
+            self.axes = axes
+
+        self.config = config
+
+        photons_dtype, contributions_dtype = get_dtype(dtype)
+        self.indices = numpy.zeros(0, dtype=numpy.int64)
+        self.sparse_photons = numpy.zeros(0, dtype=photons_dtype)
+        self.sparse_contributions = numpy.zeros(0, dtype=contributions_dtype)
+
+    @property
+    def photons(self):
+        photons = numpy.zeros(self.axes.shape, dtype=self.sparse_photons.dtype)
+        photons.ravel()[self.indices] = self.sparse_photons
+        return photons
+
+    @property
+    def contributions(self):
+        contributions = numpy.zeros(self.axes.shape, dtype=self.sparse_contributions.dtype)
+        contributions.ravel()[self.indices] = self.sparse_contributions
+        return contributions
+
+    @property
+    def npoints(self):
+        return self.axes.npoints
+
+    @property
+    def dtype(self):
+        return self.sparse_photons.dtype, self.sparse_contributions.dtype
+
+    def _contributions_max(self):
+        return self.sparse_contributions.max() if self.sparse_contributions.size else 0
+
+    def _convert_contributions(self, dtype):
+        self.sparse_contributions = self.sparse_contributions.astype(dtype)
+
+    @property
+    def memory_size(self):
+        return self.indices.nbytes + self.sparse_photons.nbytes + self.sparse_contributions.nbytes
+
+    def copy(self):
+        """Returns a copy of self. Numpy data is not shared, but the Axes object is."""
+        new = self.__class__(self.axes, self.config, self.dtype)
+        new.indices = self.indices.copy()
+        new.sparse_photons = self.sparse_photons.copy()
+        new.sparse_contributions = self.sparse_contributions.copy()
+        return new
+
+    def todense(self):
+        """Returns a regular Space with the same data."""
+        new = Space(self.axes, self.config, self.dtype)
+        new.photons.ravel()[self.indices] = self.sparse_photons
+        new.contributions.ravel()[self.indices] = self.sparse_contributions
+        return new
+
+    @classmethod
+    def from_space(cls, space):
+        """Returns space as a SparseSpace, converting it only if necessary."""
+        if isinstance(space, SparseSpace):
+            return space
+        new = cls(space.axes, space.config, space.dtype)
+        photons, contributions = space.photons.ravel(), space.contributions.ravel()
+        new.indices = numpy.flatnonzero((contributions != 0) | (photons != 0))
+        new.sparse_photons = photons[new.indices]
+        new.sparse_contributions = contributions[new.indices]
+        return new
+
+    def _add_points(self, indices, photons, contributions):
+        """Sum photons and contributions of (possibly repeated) flat grid indices into the stored grid points."""
+        indices, inverse = numpy.unique(indices, return_inverse=True)
+        photons = numpy.bincount(inverse, weights=photons)
+        contributions = numpy.bincount(inverse, weights=contributions)
+        if contributions.size:
+            self._promote_contributions(contributions.max())
+        contributions = contributions.astype(self.sparse_contributions.dtype)
+
+        position = numpy.searchsorted(self.indices, indices)
+        existing = position < self.indices.size
+        existing[existing] = self.indices[position[existing]] == indices[existing]
+        self.sparse_photons[position[existing]] += photons[existing]
+        self.sparse_contributions[position[existing]] += contributions[existing]
+
+        new = ~existing
+        if new.any():
+            self.indices = numpy.insert(self.indices, position[new], indices[new])
+            self.sparse_photons = numpy.insert(self.sparse_photons, position[new], photons[new])
+            self.sparse_contributions = numpy.insert(self.sparse_contributions, position[new], contributions[new])
+
+    def _remap(self, axes):
+        """Returns the flat indices of the stored grid points in the (larger) grid described by axes."""
+        coords = numpy.unravel_index(self.indices, self.axes.shape)
+        return numpy.ravel_multi_index(tuple(coord + (ax.imin - newax.imin) for coord, ax, newax in zip(coords, self.axes, axes)), axes.shape)
+
+    def __getitem__(self, key):
+        """Slicing only, see Space.__getitem__()."""
+        newkey = self.get_key(key)
+        coords = numpy.unravel_index(self.indices, self.axes.shape)
+        mask = numpy.ones(self.indices.shape, dtype=bool)
+        newaxes = []
+        newcoords = []
+        for k, ax, coord in zip(newkey, self.axes, coords):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(len(ax))
+                mask &= (coord >= start) & (coord < stop)
+                newaxes.append(ax[start:stop])
+                newcoords.append(coord - start)
+            else:
+                mask &= coord == k
+        if not newaxes:
+            raise ValueError('zero-dimensional spaces are not supported')
+        newspace = self.__class__(newaxes)
+        newspace.indices = numpy.ravel_multi_index(tuple(coord[mask] for coord in newcoords), newspace.axes.shape)
+        newspace.sparse_photons = self.sparse_photons[mask]
+        newspace.sparse_contributions = self.sparse_contributions[mask]
+        return newspace
+
+    def project(self, axis, *more_axes):
+        """Reduce dimensionality of Space by projecting onto 'axis', see Space.project()."""
+        index = self.axes.index(axis)
+        newaxes = list(self.axes)
+        newaxes.pop(index)
+        newspace = self.__class__(newaxes, dtype=self.dtype)
+        coords = list(numpy.unravel_index(self.indices, self.axes.shape))
+        coords.pop(index)
+        newspace._add_points(numpy.ravel_multi_index(coords, newspace.axes.shape), self.sparse_photons, self.sparse_contributions)
+
+        if more_axes:
+            return newspace.project(more_axes[0], *more_axes[1:])
+        else:
+            return newspace
+
+    def __add__(self, other):
+        if isinstance(other, numbers.Number):
+            new = self.copy()
+            new += other
+            return new
+        if not isinstance(other, Space):
+            return NotImplemented
+        if not len(self.axes) == len(other.axes) or not all(a.is_compatible(b) for (a, b) in zip(self.axes, other.axes)):
+            raise ValueError('cannot add spaces with different dimensionality or resolution')
+
+        new = self.__class__([a | b for (a, b) in zip(self.axes, other.axes)], dtype=common_dtype(self.dtype, other.dtype))
+        new += self
+        new += other
+        return new
+
+    def __iadd__(self, other):
+        if isinstance(other, numbers.Number):
+            self.sparse_photons += other * self.sparse_contributions
+            return self
+        if not isinstance(other, Space):
+            return NotImplemented
+        if not len(self.axes) == len(other.axes) or not all(a.is_compatible(b) for (a, b) in zip(self.axes, other.axes)):
+            raise ValueError('cannot add spaces with different dimensionality or resolution')
+
+        if not all(other_ax in self_ax for (self_ax, other_ax) in zip(self.axes, other.axes)):
+            return self.__add__(other)
+
+        if not isinstance(other, SparseSpace):
+            other = SparseSpace.from_space(other)
+        self._add_points(other._remap(self.axes), other.sparse_photons, other.sparse_contributions)
+        return self
+
+    def __sub__(self, other):
+        if not isinstance(other, numbers.Number) and not isinstance(other, Space):
+            return NotImplemented
+        new = self.copy()
+        new -= other
+        return new
+
+    def __isub__(self, other):
+        if isinstance(other, numbers.Number):
+            self.sparse_photons -= other * self.sparse_contributions
+            return self
+        elif not isinstance(other, Space):
+            return NotImplemented
+        if not isinstance(other, SparseSpace):
+            other = SparseSpace.from_space(other)
+        if self.axes != other.axes or not numpy.array_equal(self.indices, other.indices) or not numpy.array_equal(self.sparse_contributions, other.sparse_contributions):
+            raise ValueError('cannot subtract spaces that are not identical (axes + contributions)')
+        self.sparse_photons -= other.sparse_photons
+        return self
+
+    def __mul__(self, other):
+        if type(other) == float or type(other) == int:
+            self.sparse_photons *= other
+        else:
+            return NotImplemented
+        return self
+
+    def trim(self):
+        """Reduce total size of Space by trimming zero-contribution data points on the boundaries."""
+        keep = self.sparse_contributions > 0
+        coords = tuple(coord[keep] for coord in numpy.unravel_index(self.indices, self.axes.shape))
+        lims = tuple((int(coord.min()), int(coord.max())) for coord in coords)
+        self.axes = Axes(ax.rebound(min + ax.imin, max + ax.imin) for (ax, (min, max)) in zip(self.axes, lims))
+        self.indices = numpy.ravel_multi_index(tuple(coord - min for (coord, (min, max)) in zip(coords, lims)), self.axes.shape)
+        self.sparse_photons = self.sparse_photons[keep]
+        self.sparse_contributions = self.sparse_contributions[keep]
+
+    def rebin(self, factors):
+        """Increase bin size (= decrease resolution).
+
+        factor   positive integer or n-tuple of positive integers, see Space.rebin()"""
+        factors = rebin_factors(factors, len(self.axes))
+        lefts, rights, newaxes = zip(*[ax.rebin(factor) for ax, factor in zip(self.axes, factors)])
+        new = self.__class__(newaxes, dtype=self.dtype)
+        coords = numpy.unravel_index(self.indices, self.axes.shape)
+        newcoords = tuple(rebin_index(coord + ax.imin, factor) - newax.imin for coord, ax, newax, factor in zip(coords, self.axes, newaxes, factors))
+        new._add_points(numpy.ravel_multi_index(newcoords, new.axes.shape), self.sparse_photons, self.sparse_contributions)
+        return new
+
+    def rebin2(self, resolutions):
+        """Change bin size, see Space.rebin2()."""
+        if not len(resolutions) == len(self.axes):
+            raise ValueError('cannot rebin space with different dimensionality compatible')
+        newaxes, maps = resample_maps(self.axes, resolutions)
+        new = self.__class__(newaxes, dtype=self.dtype)
+        coords = numpy.unravel_index(self.indices, self.axes.shape)
+        new._add_points(numpy.ravel_multi_index(tuple(m[coord] for m, coord in zip(maps, coords)), new.axes.shape), self.sparse_photons, self.sparse_contributions)
+        return new
+
+    def reorder(self, labels):
+        """Change order of axes."""
+        if not self.dimension == len(labels):
+            raise ValueError('dimension mismatch')
+        newindices = list(self.axes.index(label) for label in labels)
+        new = self.__class__(tuple(self.axes[index] for index in newindices), dtype=self.dtype)
+        coords = numpy.unravel_index(self.indices, self.axes.shape)
+        new._add_points(numpy.ravel_multi_index(tuple(coords[index] for index in newindices), new.axes.shape), self.sparse_photons, self.sparse_contributions)
+        return new
+
+    def process_image(self, coordinates, intensity):
+        """Load image data into SparseSpace, see Space.process_image()."""
+        indices, intensity = self._image_indices(coordinates, intensity)
+        if intensity.size:
+            self._add_points(indices, intensity, numpy.ones(intensity.shape, dtype=self.sparse_contributions.dtype))
+
+    def tofile(self, filename, pyramid=0, projections=False, chunks=None, compression='gzip', threads=1):
+        """Store SparseSpace in HDF5 file, using the same layout and options as Space.tofile().
+        Only the HDF5 chunks that contain data are written."""
+        layout = dataset_layout(self.axes, chunks, compression)
+        layout.setdefault('chunks', True)
+        with util.atomic_write(filename) as tmpname:
+            with util.open_h5py(tmpname, 'w') as fp:
+                self.config.tofile(fp)
+                self.axes.tofile(fp)
+                Statistics.fromspace(self).tofile(fp)
+                shape = self.axes.shape
+                counts = fp.create_dataset('counts', shape, dtype=self.sparse_photons.dtype, **layout)
+                contributions = fp.create_dataset('contributions', shape, dtype=self.sparse_contributions.dtype, **dict(layout, chunks=counts.chunks))
+                if self.indices.size:
+                    write_chunks((counts, contributions), self._iter_chunks(counts.chunks), threads)
+                write_pyramid(fp, self, pyramid, compression)
+                if projections:
+                    write_projections(fp, self, compression)
+
+    def _data_blocks(self, blocksize):
+        """Yields (index key, photons, contributions) of the blocks of about blocksize grid points that contain data."""
+        for key, (photons, contributions) in self._iter_chunks(chunk_shape(self.axes.shape, blocksize)):
+            yield key, photons, contributions
+
+    def _iter_chunks(self, chunkshape):
+        """Yields (index key, (photons, contributions)) of all chunks of the given shape that contain data."""
+        shape = self.axes.shape
+        coords = numpy.unravel_index(self.indices, shape)
+        for chunkkey, group in chunk_groups(coords, shape, chunkshape):
+            key = chunk_slices(chunkkey, shape, chunkshape)
+            local = tuple(coord[group] - k.start for coord, k in zip(coords, key))
+            blockshape = tuple(k.stop - k.start for k in key)
+            blocks = []
+            for data in (self.sparse_photons, self.sparse_contributions):
+                block = numpy.zeros(blockshape, dtype=data.dtype)
+                block[local] = data[group]
+                blocks.append(block)
+            yield key, tuple(blocks)
+
+    @classmethod
+    def fromfile(cls, file, key=None, resolution=None, project=(), trim=False):
+        """Load SparseSpace from HDF5 file, one slab at a time such that the dense data never has to fit in memory.
+
+        file      filename string or h5py.File instance
+        key       sliced (subset) loading, should be an n-tuple of slice()s in data coordinates
+        resolution  optional, load the coarsest pyramid level (see tofile()) at least this fine, a number or one per axis
+        project   optional axes to project the loaded Space on, see Space.fromfile()
+        trim      optional, trim the loaded Space like trim()"""
+        if project:
+            return cls.from_space(Space.fromfile(file, key, resolution, project, trim))
+        try:
+            with util.open_h5py(file, 'r') as fp:
+                data = pyramid_level(fp, resolution)
+                axes = Axes.fromfile(data)
+                config = util.ConfigFile.fromfile(fp)
+                if key:
+                    if len(axes) != len(key):
+                        raise ValueError("dimensionality of 'key' does not match dimensionality of Space in HDF5 file {0}".format(file))
+                    key = tuple(ax.get_index(k) for k, ax in zip(key, axes))
+                    axes = tuple(ax[k] for k, ax in zip(key, axes) if isinstance(k, slice))
+                else:
+                    key = tuple(slice(None) for ax in axes)
+                try:
+                    space = cls(axes, config, (data['counts'].dtype, data['contributions'].dtype))
+                    space._read_slabs(data['counts'], data['contributions'], key)
+                except (KeyError, TypeError) as e:
+                    raise errors.HDF5FileError('unable to load Space from HDF5 file {0}, is it a valid BINoculars file? (original error: {1!r})'.format(file, e))
+        except IOError as e:
+            raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(file, e))
+        if trim and (space.sparse_contributions > 0).any():
+            space.trim()
+        return space
+
+    def _read_slabs(self, counts, contributions, key):
+        """Read the nonzero grid points of a hyperslab (index key) of the counts and contributions datasets."""
+        key = tuple(slice(*k.indices(size)[:2]) if isinstance(k, slice) else k for k, size in zip(key, counts.shape))
+        # the first sliced dataset dimension is the first axis of this space
+        dim = [isinstance(k, slice) for k in key].index(True)
+        step = counts.chunks[dim] if counts.chunks else 1
+        stride = int(numpy.prod(self.axes.shape[1:]))
+
+        indices, photons, contribs = [], [], []
+        for start in range(key[dim].start, key[dim].stop, step):
+            slabkey = key[:dim] + (slice(start, min(start + step, key[dim].stop)),) + key[dim+1:]
+            slabphotons = counts[slabkey].ravel()
+            slabcontribs = contributions[slabkey].ravel()
+            nonzero = numpy.flatnonzero((slabcontribs != 0) | (slabphotons != 0))
+            indices.append(nonzero + (start - key[dim].start) * stride)
+            photons.append(slabphotons[nonzero])
+            contribs.append(slabcontribs[nonzero])
+        if indices:
+            self.indices = numpy.concatenate(indices)
+            self.sparse_photons = numpy.concatenate(photons)
+            self.sparse_contributions = numpy.concatenate(contribs)
+
+
+class HDF5Space(Space):
+    """Space variant for volumes larger than memory. Photons and contributions are stored
+    in chunked HDF5 datasets in a scratch file (in the default temporary directory, see the
+    tempfile module), with an in-memory cache of the most recently used chunks.
+
+    process_image() and in-place addition only touch the chunks they hit, dirty chunks are
+    written back when they are evicted from the cache. Pickling an HDF5Space flushes the cache
+    and hands the scratch file over to the unpickled copy, which removes it when it is deleted.
+
+    The photons and contributions attributes read the complete datasets into memory, avoid
+    them on large volumes. Contributions are stored with at least 32 bits, as a scratch
+    dataset cannot be promoted to a wider type cheaply.
+
+    Important attributes:
+        axes          Axes instances describing range and stepsizes of each of the dimensions
+        filename      scratch HDF5 file holding the 'counts' and 'contributions' datasets
+        dimension     n"""
+
+    chunksize = 2**15 # target number of grid points per chunk
+    cachesize = 128 # number of chunks kept in memory
+    instances = weakref.WeakSet() # all instances of this process, see close_scratch_spaces()
+
+    def __init__(self, axes, config=None, dtype=None):
+        if not isinstance(axes, Axes):
+            self.axes = Axes(axes)
+        else:
+            self.axes = axes
+
+        self.config = config
+
+        photons_dtype, contributions_dtype = get_dtype(dtype)
+        self._dtype = photons_dtype, numpy.promote_types(contributions_dtype, numpy.uint32)
+        self._file = None
+        self._owner = False
+        self._cache = collections.OrderedDict()
+        self._create(self.axes)
+        HDF5Space.instances.add(self)
+
+    def _create(self, axes):
+        """Replace the scratch file by a new, empty one for the grid described by axes."""
+        fd, filename = tempfile.mkstemp(prefix='binoculars-', suffix='.hdf5')
+        os.close(fd)
+        self._file = h5py.File(filename, 'w')
+        self.filename = filename
+        self._owner = True
+        self.axes = axes
+        self.chunkshape = chunk_shape(self.axes.shape, self.chunksize)
+        self._file.create_dataset('counts', self.axes.shape, dtype=self._dtype[0], chunks=self.chunkshape)
+        self._file.create_dataset('contributions', self.axes.shape, dtype=self._dtype[1], chunks=self.chunkshape)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def _fp(self):
+        if self._file is None:
+            self._file = h5py.File(self.filename, 'r+')
+        return self._file
+
+    def flush(self):
+        """Write all dirty chunks in the cache to the scratch file."""
+        for chunkkey, block in self._cache.iteritems():
+            if block[2]:
+                self._write_chunk(chunkkey, block)
+
+    def close(self):
+        """Close the scratch file and remove it if this instance owns it."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._owner and os.path.exists(self.filename):
+            os.remove(self.filename)
+        self._owner = False
+        self._cache.clear()
+
+    def __del__(self):
+        if hasattr(self, '_cache'):
+            self.close()
+
+    def __getstate__(self):
+        self.flush()
+        self._cache.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        state = self.__dict__.copy()
+        self._owner = False # ownership of the scratch file is transferred to the unpickled copy
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        HDF5Space.instances.add(self)
+
+    def _read_chunk(self, chunkkey):
+        key = chunk_slices(chunkkey, self.axes.shape, self.chunkshape)
+        return [self._fp['counts'][key], self._fp['contributions'][key], False]
+
+    def _write_chunk(self, chunkkey, block):
+        key = chunk_slices(chunkkey, self.axes.shape, self.chunkshape)
+        self._fp['counts'][key] = block[0]
+        self._fp['contributions'][key] = block[1]
+        block[2] = False
+
+    def _get_chunk(self, chunkkey):
+        """Returns [photons, contributions, dirty] of a chunk, set dirty to True after modifying the data."""
+        try:
+            block = self._cache.pop(chunkkey)
+        except KeyError:
+            block = self._read_chunk(chunkkey)
+        self._cache[chunkkey] = block
+        while len(self._cache) > self.cachesize:
+            oldkey, oldblock = self._cache.popitem(last=False)
+            if oldblock[2]:
+                self._write_chunk(oldkey, oldblock)
+        return block
+
+    def _chunk_keys(self):
+        return itertools.product(*(xrange(-(-size // chunk)) for size, chunk in zip(self.axes.shape, self.chunkshape)))
+
+    def _iter_blocks(self):
+        """Yields (index key, photons, contributions) of all chunks that contain data."""
+        for chunkkey in self._chunk_keys():
+            if chunkkey in self._cache:
+                photons, contributions, dirty = self._cache[chunkkey]
+            else:
+                photons, contributions, dirty = self._read_chunk(chunkkey)
+            if contributions.any() or photons.any():
+                yield chunk_slices(chunkkey, self.axes.shape, self.chunkshape), photons, contributions
+
+    def _data_blocks(self, blocksize):
+        """Yields (index key, photons, contributions) of the chunks that contain data, blocksize is ignored."""
+        return self._iter_blocks()
+
+    def _add_block(self, origin, photons, contributions):
+        """Add a block of data with its first element at grid index origin, the part outside the grid is ignored."""
+        shape = self.axes.shape
+        lower = tuple(max(start, 0) for start in origin)
+        upper = tuple(min(start + length, size) for start, length, size in zip(origin, photons.shape, shape))
+        if any(low >= up for low, up in zip(lower, upper)):
+            return
+        ranges = (xrange(low // chunk, (up - 1) // chunk + 1) for low, up, chunk in zip(lower, upper, self.chunkshape))
+        for chunkkey in itertools.product(*ranges):
+            key = chunk_slices(chunkkey, shape, self.chunkshape)
+            first = tuple(max(low, k.start) for low, k in zip(lower, key))
+            last = tuple(min(up, k.stop) for up, k in zip(upper, key))
+            dst = tuple(slice(a - k.start, b - k.start) for a, b, k in zip(first, last, key))
+            src = tuple(slice(a - start, b - start) for a, b, start in zip(first, last, origin))
+            block = self._get_chunk(chunkkey)
+            block[0][dst] += photons[src]
+            numpy.add(block[1][dst], contributions[src], out=block[1][dst], casting='unsafe')
+            block[2] = True
+
+    def _add_space(self, other):
+        """Add the data of another Space, the part outside the grid is ignored."""
+        offset = tuple(theirs.imin - ours.imin for ours, theirs in zip(self.axes, other.axes))
+        if isinstance(other, HDF5Space):
+            blocks = other._iter_blocks()
+        else:
+            blocks = [(tuple(slice(0, size) for size in other.axes.shape), other.photons, other.contributions)]
+        for key, photons, contributions in blocks:
+            self._add_block(tuple(k.start + o for k, o in zip(key, offset)), photons, contributions)
+
+    def _reallocate(self, axes):
+        """Move the data to a new scratch file for the grid described by axes."""
+        new = self.__class__(axes, self.config, self.dtype)
+        new._add_space(self)
+        self.close()
+        self.__dict__.update(new.__dict__)
+        new._file = None
+        new._owner = False
+        new._cache = collections.OrderedDict()
+
+    @property
+    def photons(self):
+        self.flush()
+        return self._fp['counts'][...]
+
+    @property
+    def contributions(self):
+        self.flush()
+        return self._fp['contributions'][...]
+
+    @property
+    def npoints(self):
+        return self.axes.npoints
+
+    @property
+    def memory_size(self):
+        """Returns approximate memory consumption of the chunk cache."""
+        return __builtin__.sum(block[0].nbytes + block[1].nbytes for block in self._cache.itervalues())
+
+    def copy(self):
+        """Returns a copy of self in a new scratch file. The Axes object is shared."""
+        new = self.__class__(self.axes, self.config, self.dtype)
+        new._add_space(self)
+        return new
+
+    def todense(self):
+        """Returns a regular Space with the same data."""
+        new = Space(self.axes, self.config, self.dtype)
+        new.photons = self.photons
+        new.contributions = self.contributions
+        return new
+
+    def __getitem__(self, key):
+        """Slicing only, see Space.__getitem__(). Returns a regular Space."""
+        newkey = self.get_key(key)
+        newaxes = tuple(ax[k] for k, ax in zip(newkey, self.axes) if isinstance(ax[k], Axis))
+        if not newaxes:
+            raise ValueError('zero-dimensional spaces are not supported')
+        self.flush()
+        newspace = Space(newaxes)
+        newspace.photons = self._fp['counts'][newkey]
+        newspace.contributions = self._fp['contributions'][newkey]
+        return newspace
+
+    def project(self, axis, *more_axes):
+        """Reduce dimensionality of Space by projecting onto 'axis', see Space.project().
+        Works one chunk at a time, returns a regular Space."""
+        index = self.axes.index(axis)
+        newaxes = list(self.axes)
+        newaxes.pop(index)
+        newspace = Space(newaxes)
+        newspace.contributions = newspace.contributions.astype(numpy.uint64) # contributions.sum() upcasts as well
+        for key, photons, contributions in self._iter_blocks():
+            key = key[:index] + key[index+1:]
+            newspace.photons[key] += photons.sum(axis=index)
+            newspace.contributions[key] += contributions.sum(axis=index)
+
+        if more_axes:
+            return newspace.project(more_axes[0], *more_axes[1:])
+        else:
+            return newspace
+
+    def __add__(self, other):
+        if isinstance(other, numbers.Number):
+            new = self.copy()
+            new += other
+            return new
+        if not isinstance(other, Space):
+            return NotImplemented
+        if not len(self.axes) == len(other.axes) or not all(a.is_compatible(b) for (a, b) in zip(self.axes, other.axes)):
+            raise ValueError('cannot add spaces with different dimensionality or resolution')
+
+        new = self.__class__([a | b for (a, b) in zip(self.axes, other.axes)], dtype=common_dtype(self.dtype, other.dtype))
+        new += self
+        new += other
+        return new
+
+    def __iadd__(self, other):
+        """In-place addition, grows the grid if necessary."""
+        if isinstance(other, numbers.Number):
+            for chunkkey in self._chunk_keys():
+                block = self._get_chunk(chunkkey)
+                block[0] += other * block[1]
+                block[2] = True
+            return self
+        if not isinstance(other, Space):
+            return NotImplemented
+        if not len(self.axes) == len(other.axes) or not all(a.is_compatible(b) for (a, b) in zip(self.axes, other.axes)):
+            raise ValueError('cannot add spaces with different dimensionality or resolution')
+
+        if not all(other_ax in self_ax for (self_ax, other_ax) in zip(self.axes, other.axes)):
+            self._reallocate(Axes(a | b for (a, b) in zip(self.axes, other.axes)))
+        self._add_space(other)
+        return self
+
+    def __sub__(self, other):
+        if not isinstance(other, numbers.Number) and not isinstance(other, Space):
+            return NotImplemented
+        new = self.copy()
+        new -= other
+        return new
+
+    def __isub__(self, other):
+        if isinstance(other, numbers.Number):
+            self += -other
+            return self
+        elif not isinstance(other, Space):
+            return NotImplemented
+        if self.axes != other.axes:
+            raise ValueError('cannot subtract spaces that are not identical (axes + contributions)')
+        keys = list(chunk_slices(chunkkey, self.axes.shape, self.chunkshape) for chunkkey in self._chunk_keys())
+        if isinstance(other, HDF5Space):
+            other.flush()
+            get = lambda name, key: other._fp[name][key]
+        else:
+            data = {'counts': other.photons, 'contributions': other.contributions}
+            get = lambda name, key: data[name][key]
+        for chunkkey, key in zip(self._chunk_keys(), keys):
+            if not (self._get_chunk(chunkkey)[1] == get('contributions', key)).all():
+                raise ValueError('cannot subtract spaces that are not identical (axes + contributions)')
+        for chunkkey, key in zip(self._chunk_keys(), keys):
+            block = self._get_chunk(chunkkey)
+            block[0] -= get('counts', key)
+            block[2] = True
+        return self
+
+    def __mul__(self, other):
+        if type(other) == float or type(other) == int:
+            for chunkkey in self._chunk_keys():
+                block = self._get_chunk(chunkkey)
+                block[0] *= other
+                block[2] = True
+        else:
+            return NotImplemented
+        return self
+
+    def trim(self):
+        """Reduce total size of Space by trimming zero-contribution data points on the boundaries."""
+        lower = upper = None
+        for key, photons, contributions in self._iter_blocks():
+            mask = contributions > 0
+            if not mask.any():
+                continue
+            lims = tuple(numpy.flatnonzero(sum_onto(mask, i)) for i in range(self.dimension))
+            blocklower = tuple(lim.min() + k.start for lim, k in zip(lims, key))
+            blockupper = tuple(lim.max() + k.start for lim, k in zip(lims, key))
+            lower = blocklower if lower is None else tuple(min(a, b) for a, b in zip(lower, blocklower))
+            upper = blockupper if upper is None else tuple(max(a, b) for a, b in zip(upper, blockupper))
+        if lower is None:
+            raise ValueError('cannot trim a space without contributions')
+        self._reallocate(Axes(ax.rebound(int(low) + ax.imin, int(up) + ax.imin) for (ax, low, up) in zip(self.axes, lower, upper)))
+
+    def rebin(self, factors):
+        """Increase bin size, see Space.rebin(). Works one chunk at a time, returns an HDF5Space."""
+        factors = rebin_factors(factors, len(self.axes))
+        lefts, rights, newaxes = zip(*[ax.rebin(factor) for ax, factor in zip(self.axes, factors)])
+        new = self.__class__(newaxes, dtype=self.dtype)
+        for key, photons, contributions in self._iter_blocks():
+            starts = tuple(ax.imin + k.start for ax, k in zip(self.axes, key))
+            lefts = tuple((start + rebin_shift(factor)) % factor for start, factor in zip(starts, factors))
+            shape = tuple(-(-(left + size) // factor) for left, size, factor in zip(lefts, photons.shape, factors))
+            origin = tuple(rebin_index(start, factor) - newax.imin for start, factor, newax in zip(starts, factors, newaxes))
+            new._add_block(origin, rebin_array(photons, lefts, factors, shape), rebin_array(contributions, lefts, factors, shape))
+        return new
+
+    def rebin2(self, resolutions):
+        """Change bin size, see Space.rebin2(). Works one chunk at a time, returns an HDF5Space."""
+        if not len(resolutions) == len(self.axes):
+            raise ValueError('cannot rebin space with different dimensionality compatible')
+        newaxes, maps = resample_maps(self.axes, resolutions)
+        new = self.__class__(newaxes, dtype=self.dtype)
+        for key, photons, contributions in self._iter_blocks():
+            blockmaps = tuple(m[k] for m, k in zip(maps, key))
+            photons, origin = resample_array(photons, blockmaps)
+            new._add_block(origin, photons, resample_array(contributions, blockmaps)[0])
+        return new
+
+    def reorder(self, labels):
+        """Change order of axes, see Space.reorder(). Returns a regular Space."""
+        return self.todense().reorder(labels)
+
+    def process_image(self, coordinates, intensity):
+        """Load image data into HDF5Space, see Space.process_image(). Only the chunks hit by the image are touched."""
+        indices, intensity = self._image_indices(coordinates, intensity)
+        if not intensity.size:
+            return
+
+        coords = numpy.unravel_index(indices, self.axes.shape)
+        for chunkkey, group in chunk_groups(coords, self.axes.shape, self.chunkshape):
+            block = self._get_chunk(chunkkey)
+            key = chunk_slices(chunkkey, self.axes.shape, self.chunkshape)
+            local = numpy.ravel_multi_index(tuple(coord[group] - k.start for coord, k in zip(coords, key)), block[0].shape)
+            photons = numpy.bincount(local, weights=intensity[group])
+            contributions = numpy.bincount(local)
+            block[0].ravel()[:photons.size] += photons
+            flat = block[1].ravel()[:contributions.size]
+            numpy.add(flat, contributions, out=flat, casting='unsafe')
+            block[2] = True
+
+    def tofile(self, filename, pyramid=0, projections=False, chunks=None, compression='gzip', threads=1):
+        """Store HDF5Space in HDF5 file, using the same layout and options as Space.tofile(). Copies one chunk at a time."""
+        layout = dataset_layout(self.axes, chunks, compression)
+        layout.setdefault('chunks', self.chunkshape)
+        with util.atomic_write(filename) as tmpname:
+            with util.open_h5py(tmpname, 'w') as fp:
+                self.config.tofile(fp)
+                self.axes.tofile(fp)
+                Statistics.fromspace(self).tofile(fp)
+                counts = fp.create_dataset('counts', self.axes.shape, dtype=self.dtype[0], **layout)
+                contributions = fp.create_dataset('contributions', self.axes.shape, dtype=self.dtype[1], **dict(layout, chunks=counts.chunks))
+                blocks = ((key, (photons, contribs)) for key, photons, contribs in self._iter_blocks())
+                # parallel compression needs blocks that match the chunks in the file
+                write_chunks((counts, contributions), blocks, threads if counts.chunks == self.chunkshape else 1)
+                write_pyramid(fp, self, pyramid, compression)
+                if projections:
+                    write_projections(fp, self, compression)
+
+    @classmethod
+    def fromfile(cls, file, key=None, resolution=None, project=(), trim=False):
+        """Load HDF5Space from HDF5 file, one chunk at a time such that the data never has to fit in memory.
+
+        file      filename string or h5py.File instance
+        key       sliced (subset) loading, should be an n-tuple of slice()s in data coordinates
+        resolution  optional, load the coarsest pyramid level (see tofile()) at least this fine, a number or one per axis
+        project   optional axes to project the loaded Space on, see Space.fromfile(). The projection is summed
+                  chunk by chunk while reading, only the projected Space is stored in the scratch file
+        trim      optional, trim the loaded Space like trim()"""
+        if project:
+            return cls.from_space(Space.fromfile(file, key, resolution, project, trim))
+        try:
+            with util.open_h5py(file, 'r') as fp:
+                data = pyramid_level(fp, resolution)
+                axes = Axes.fromfile(data)
                 config = util.ConfigFile.fromfile(fp)
                 if key:
                     if len(axes) != len(key):
@@ -671,17 +1859,578 @@ class Space(object):
                     key = tuple(ax.get_index(k) for k, ax in zip(key, axes))
                     axes = tuple(ax[k] for k, ax in zip(key, axes) if isinstance(k, slice))
                 else:
-                    key = Ellipsis
-                space = cls(axes, config)
+                    key = tuple(slice(None) for ax in axes)
                 try:
-                    fp['counts'].read_direct(space.photons, key)
-                    fp['contributions'].read_direct(space.contributions, key)
+                    counts, contributions = data['counts'], data['contributions']
+                    space = cls(axes, config, (counts.dtype, contributions.dtype))
+                    key = tuple(slice(*k.indices(size)[:2]) if isinstance(k, slice) else k for k, size in zip(key, counts.shape))
+                    for chunkkey in space._chunk_keys():
+                        blockkey = iter(chunk_slices(chunkkey, space.axes.shape, space.chunkshape))
+                        srckey = []
+                        for k in key:
+                            if isinstance(k, slice):
+                                b = next(blockkey)
+                                k = slice(k.start + b.start, k.start + b.stop)
+                            srckey.append(k)
+                        srckey = tuple(srckey)
+                        photons, contribs = counts[srckey], contributions[srckey]
+                        if contribs.any() or photons.any():
+                            block = space._get_chunk(chunkkey)
+                            block[0][...] = photons
+                            block[1][...] = contribs
+                            block[2] = True
                 except (KeyError, TypeError) as e:
                     raise errors.HDF5FileError('unable to load Space from HDF5 file {0}, is it a valid BINoculars file? (original error: {1!r})'.format(file, e))
         except IOError as e:
             raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(file, e))
+        if trim:
+            try:
+                space.trim()
+            except ValueError: # no contributions, nothing to trim
+                pass
+        return space
+
+
+def close_scratch_spaces():
+    """Close all HDF5Space instances of this process, removing the scratch files they own. Also called at exit,
+    for instances that are never deleted, e.g. because a traceback still refers to them."""
+    for space in list(HDF5Space.instances):
+        space.close()
+
+atexit.register(close_scratch_spaces)
+
+
+class LazySpace(object):
+    """Space in an HDF5 file that records slice() and project() instead of executing them.
+
+    Slices are pushed down into the read from the file and projections are summed one block of
+    the file at a time, such that only the final result has to fit in memory. load() reads the
+    result as a regular Space, other operations like rebin() and transform_coordinates() load it first.
+
+    Important attributes:
+        axes        Axes instance describing the result
+        fileaxes    Axes instance describing the data in the file
+        key         per file axis, the index (slice or integer) read from the file
+        projected   set of the indices of the file axes that are summed"""
+
+    def __init__(self, filename, fileaxes, resolution=None):
+        self.filename = filename
+        self.fileaxes = fileaxes
+        self.resolution = resolution
+        self.key = [slice(None)] * len(fileaxes)
+        self.projected = set()
+
+    @classmethod
+    def fromfile(cls, filename, resolution=None):
+        """Open a Space in an HDF5 file lazily, the data is only read by load().
+
+        filename    name of the file
+        resolution  optional, use the coarsest pyramid level at least this fine, see Space.fromfile()"""
+        try:
+            with util.open_h5py(filename, 'r') as fp:
+                axes = Axes.fromfile(pyramid_level(fp, resolution))
+        except IOError as e:
+            raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(filename, e))
+        except KeyError as e:
+            raise errors.HDF5FileError('unable to load Space from HDF5 file {0}, is it a valid BINoculars file? (original error: {1!r})'.format(filename, e))
+        return cls(filename, axes, resolution)
+
+    def copy(self):
+        new = self.__class__(self.filename, self.fileaxes, self.resolution)
+        new.key = list(self.key)
+        new.projected = set(self.projected)
+        return new
+
+    def _remaining(self):
+        """Indices of the file axes that are left in the result."""
+        return [i for i, k in enumerate(self.key) if isinstance(k, slice) and i not in self.projected]
+
+    @property
+    def axes(self):
+        return Axes(self.fileaxes[i][self.key[i]] for i in self._remaining())
+
+    @property
+    def dimension(self):
+        return len(self._remaining())
+
+    def project(self, axis, *more_axes):
+        """Reduce dimensionality by projecting onto 'axis', see Space.project()."""
+        new = self.copy()
+        new.projected.add(self._remaining()[self.axes.index(axis)])
+        if more_axes:
+            return new.project(more_axes[0], *more_axes[1:])
+        return new
+
+    def slice(self, axis, key):
+        """Single-axis slice in data coordinates, see Space.slice()."""
+        index = self._remaining()[self.axes.index(axis)]
+        current = self.key[index]
+        offset = current.start or 0
+        k = self.fileaxes[index][current].get_index(key)
+        if isinstance(k, slice):
+            k = slice(offset + (k.start or 0), current.stop if k.stop is None else offset + k.stop)
+        else:
+            k = offset + k
+        new = self.copy()
+        new.key[index] = k
+        if not new.dimension:
+            raise ValueError('zero-dimensional spaces are not supported')
+        return new
+
+    def rebin(self, factors):
+        return self.load().rebin(factors)
+
+    def transform_coordinates(self, *args, **kwargs):
+        return self.load().transform_coordinates(*args, **kwargs)
+
+    def statistics(self):
+        """Returns the Statistics stored by Space.tofile() for the result, when it is the full resolution data or one
+        of the stored projections and no axis is sliced, without reading the data. Otherwise returns None."""
+        if not all(isinstance(k, slice) and k.indices(len(ax))[:2] == (0, len(ax)) for k, ax in zip(self.key, self.fileaxes)):
+            return None
+        try:
+            with util.open_h5py(self.filename, 'r') as fp:
+                if pyramid_level(fp, self.resolution) is not fp:
+                    return None
+                return Statistics.fromfile(fp, project=tuple(self.fileaxes[i].label for i in sorted(self.projected)), compute=False)
+        except IOError as e:
+            raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(self.filename, e))
+
+    def load(self):
+        """Reads the result from the file, returns a regular Space."""
+        axes = self.axes
+        try:
+            with util.open_h5py(self.filename, 'r') as fp:
+                config = util.ConfigFile.fromfile(fp)
+                data = pyramid_level(fp, self.resolution)
+                key = tuple(self.key)
+                projected = sorted(self.projected)
+                if data is fp and projected and 'projections' in fp:
+                    # the projections stored by Space.tofile() are complete sums, usable when the projected axes are not sliced
+                    name = ','.join(str(i) for i in range(len(key)) if i not in self.projected)
+                    if name in fp['projections'] and all(key[i].indices(len(self.fileaxes[i]))[:2] == (0, len(self.fileaxes[i])) for i in projected):
+                        data = fp['projections'][name]
+                        key = tuple(k for i, k in enumerate(key) if i not in self.projected)
+                        projected = []
+                photons, contributions = read_data(data, key, projected)
+                space = Space(axes, config, (photons.dtype, contributions.dtype))
+                space.photons, space.contributions = photons, contributions
+        except (KeyError, TypeError) as e:
+            raise errors.HDF5FileError('unable to load Space from HDF5 file {0}, is it a valid BINoculars file? (original error: {1!r})'.format(self.filename, e))
+        except IOError as e:
+            raise errors.HDF5FileError("unable to open '{0}' as HDF5 file (original error: {1!r})".format(self.filename, e))
+        return space
+
+    def __repr__(self):
+        return '{0.__class__.__name__} ({0.dimension} dimensions, of {0.filename}) {{\n    {1}\n}}'.format(self, '\n    '.join(repr(ax) for ax in self.axes))
+
+
+class SharedSpace(object):
+    """Picklable handle to a copy of a dense Space in a file in shared memory (/dev/shm, or directory).
+
+    Sending the handle to another process instead of the Space avoids pickling and piping the data,
+    the receiving process maps the file with load(). The file is removed by load()."""
+
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+    def __init__(self, space, directory=None):
+        self.axes = space.axes
+        self.config = space.config
+        self.dtype = space.dtype
+        fd, self.filename = tempfile.mkstemp(prefix='binoculars-', suffix='.space', dir=directory or self.directory)
+        with os.fdopen(fd, 'wb') as fp:
+            space.photons.tofile(fp)
+            space.contributions.tofile(fp)
+
+    def load(self):
+        """Returns the Space, its arrays are copy-on-write mappings of the file."""
+        shape = self.axes.shape
+        photons = numpy.memmap(self.filename, dtype=self.dtype[0], mode='c', shape=shape)
+        contributions = numpy.memmap(self.filename, dtype=self.dtype[1], mode='c', shape=shape, offset=photons.nbytes)
+        os.remove(self.filename) # the mappings stay valid
+        space = Space(self.axes, self.config, self.dtype)
+        space.photons, space.contributions = photons, contributions
         return space
 
+
+storage_classes = {'dense': Space, 'sparse': SparseSpace, 'hdf5': HDF5Space}
+
+
+def rebin_factors(factors, dimension):
+    """Returns factors, an integer or n-tuple of integers, as validated n-tuple."""
+    if isinstance(factors, numbers.Number):
+        factors = (factors,) * dimension
+    elif len(factors) != dimension:
+        raise ValueError('dimension mismatch between factors and axes')
+    if not all(isinstance(factor, numbers.Integral) and factor > 0 for factor in factors):
+        raise ValueError('binning factors must be positive integers')
+    return tuple(int(factor) for factor in factors)
+
+def rebin_shift(factor):
+    return factor // 2 if factor % 2 else 0
+
+def rebin_index(index, factor):
+    """Returns the bin of grid index (integer or integer array) after rebinning by factor, see Axis.rebin()."""
+    return (index + rebin_shift(factor)) // factor
+
+def rebin_array(array, lefts, factors, shape, dtype=None):
+    """Sums blocks of factors[i] elements along every axis of array, as if it were padded with lefts[i] empty
+    elements at the start (and as many as needed at the end) to fill an array of the given shape exactly.
+
+    Reduces one axis at a time using a reshape, only the partially filled bins at the edges are summed
+    separately, so no padded copy of the full array is made."""
+    for axis, (left, factor, size) in enumerate(zip(lefts, factors, shape)):
+        def part(start, stop):
+            return array[(slice(None),) * axis + (slice(start, stop),)]
+        length = array.shape[axis]
+        head = min((factor - left) % factor, length)
+        body = (length - head) // factor * factor
+        parts = []
+        if head:
+            parts.append(part(0, head).sum(axis=axis, keepdims=True, dtype=dtype))
+        if body:
+            blocks = part(head, head + body)
+            parts.append(blocks.reshape(blocks.shape[:axis] + (body // factor, factor) + blocks.shape[axis+1:]).sum(axis=axis+1, dtype=dtype))
+        if head + body < length:
+            parts.append(part(head + body, length).sum(axis=axis, keepdims=True, dtype=dtype))
+        if len(parts) == 1 and parts[0].shape[axis] == size:
+            array = parts[0]
+            continue
+        empty = list(parts[0].shape)
+        empty[axis] = size - __builtin__.sum(p.shape[axis] for p in parts)
+        parts.append(numpy.zeros(empty, dtype=parts[0].dtype))
+        array = numpy.concatenate(parts, axis=axis)
+    return array
+
+def write_pyramid(fp, space, levels, compression='gzip'):
+    """Store up to levels successively 2x coarser copies of space in the 'pyramid' group of the open HDF5 file fp,
+    one subgroup per rebinning factor using the same layout as Space.tofile(), without statistics."""
+    factor = 1
+    for level in range(levels):
+        coarser = space.rebin(2)
+        if coarser.axes.shape == space.axes.shape:
+            break
+        space = coarser
+        factor *= 2
+        write_group(fp.require_group('pyramid').create_group(str(factor)), space, compression)
+
+def write_projections(fp, space, compression='gzip'):
+    """Store the projections of space onto every single axis and pair of axes in the 'projections' group
+    of the open HDF5 file fp, one subgroup named after the indices of the remaining axes, e.g. '0,2'."""
+    dimension = len(space.axes)
+    projections = {}
+    for size in (2, 1):
+        for kept in itertools.combinations(range(dimension), size):
+            if size >= dimension:
+                continue
+            source, axes = space, range(dimension)
+            if size == 1 and dimension > 2: # project a pair further, much cheaper than the full Space
+                axes = sorted(kept + (1 if kept[0] == 0 else 0,))
+                source = projections[tuple(axes)]
+            projections[kept] = source.project(*sorted((axes.index(i) for i in axes if i not in kept), reverse=True))
+            # with statistics for the color scale of previews, cheap as a projection is much smaller than the Space
+            write_group(fp.require_group('projections').create_group(','.join(str(i) for i in kept)), projections[kept], compression, statistics=True)
+
+def projection_group(fp, key, project):
+    """Returns the group of the open HDF5 file fp holding the projection stored by write_projections() that equals
+    loading key and projecting on project, and the key to load from it. Returns (None, None) if there is none."""
+    if 'projections' not in fp:
+        return None, None
+    axes = Axes.fromfile(fp)
+    if not key:
+        key = (slice(None),) * len(axes)
+    if len(key) != len(axes) or not all(isinstance(k, slice) for k in key):
+        return None, None
+    remaining = range(len(axes))
+    removed = []
+    for axis in project: # the same sequence of indices as Space.project()
+        removed.append(remaining.pop(Axes(axes[i] for i in remaining).index(axis)))
+    name = ','.join(str(i) for i in remaining)
+    if name not in fp['projections']:
+        return None, None
+    for i in removed:
+        if axes[i].get_index(key[i]).indices(len(axes[i])) != (0, len(axes[i]), 1):
+            return None, None
+    return fp['projections'][name], tuple(key[i] for i in remaining)
+
+def write_group(group, space, compression='gzip', statistics=False):
+    """Store the axes and data of space in an HDF5 group, using the same layout as Space.tofile().
+    With statistics, also store the Statistics of space."""
+    space.axes.tofile(group)
+    if statistics:
+        Statistics.fromspace(space).tofile(group)
+    photons, contributions = space.photons, space.contributions
+    layout = compression_options(compression)
+    group.create_dataset('counts', photons.shape, dtype=photons.dtype, **layout).write_direct(photons)
+    group.create_dataset('contributions', contributions.shape, dtype=contributions.dtype, **layout).write_direct(contributions)
+
+def write_chunks(datasets, blocks, threads=1):
+    """Write blocks of data into HDF5 datasets, compressing them on a pool of threads.
+
+    datasets  sequence of h5py datasets with the same shape and chunk shape
+    blocks    iterable of (index key, arrays) with one array per dataset, each block covering exactly one chunk
+    threads   number of threads, for 1 or filters other than gzip and shuffle the blocks are written by h5py
+
+    The compressed chunks are stored with direct chunk writes, chunks without data are skipped. As zlib
+    releases the GIL, compressing the final output of a run scales with the number of cores."""
+    levels = tuple(direct_chunk_level(dataset) for dataset in datasets)
+    if threads <= 1 or None in levels:
+        for key, arrays in blocks:
+            for dataset, array in zip(datasets, arrays):
+                dataset[key] = array
+        return
+
+    def compress(item):
+        key, arrays = item
+        if not any(array.any() for array in arrays):
+            return None
+        chunks = []
+        for dataset, level, array in zip(datasets, levels, arrays):
+            chunk = numpy.zeros(dataset.chunks, dtype=dataset.dtype)
+            chunk[tuple(slice(0, k.stop - k.start) for k in key)] = array
+            data = chunk.view(numpy.uint8)
+            if dataset.shuffle: # the shuffle filter groups the n-th bytes of all elements
+                data = data.reshape(-1, dataset.dtype.itemsize).T
+            chunks.append(zlib.compress(data.tostring(), level))
+        return tuple(k.start for k in key), chunks
+
+    pool = multiprocessing.pool.ThreadPool(threads)
+    try:
+        for batch in util.grouper(iter(blocks), 4 * threads):
+            for result in pool.map(compress, batch):
+                if result is not None:
+                    offset, chunks = result
+                    for dataset, chunk in zip(datasets, chunks):
+                        dataset.id.write_direct_chunk(offset, chunk)
+    finally:
+        pool.close()
+        pool.join()
+
+def direct_chunk_level(dataset):
+    """Returns the gzip level of a dataset if write_chunks() can apply its filters itself, None otherwise."""
+    if dataset.chunks is None or dataset.compression != 'gzip' or dataset.fletcher32 or dataset.scaleoffset is not None:
+        return None
+    return dataset.compression_opts
+
+def compression_options(spec='gzip'):
+    """Returns the h5py create_dataset() keyword arguments for a compression specification: 'none', 'lzf',
+    'gzip' or 'gzip:<level>' (0-9), optionally followed by ',shuffle' to enable the byte shuffle filter."""
+    filters = [item.strip().lower() for item in spec.split(',')]
+    options = {}
+    if filters[-1] == 'shuffle':
+        options['shuffle'] = True
+        filters.pop()
+    if len(filters) != 1:
+        raise ValueError("invalid compression '{0}', expected none, lzf, gzip or gzip:<level>, optionally followed by ',shuffle'".format(spec))
+    name, sep, level = filters[0].partition(':')
+    if name == 'gzip':
+        options['compression'] = 'gzip'
+        if level:
+            if not level.isdigit() or int(level) > 9:
+                raise ValueError("invalid gzip level '{0}', expected 0-9".format(level))
+            options['compression_opts'] = int(level)
+    elif name == 'lzf' and not level:
+        options['compression'] = 'lzf'
+    elif name != 'none' or level:
+        raise ValueError("invalid compression '{0}', expected none, lzf, gzip or gzip:<level>, optionally followed by ',shuffle'".format(spec))
+    return options
+
+slice_chunksize = 2**17 # elements per chunk for layouts optimized for slicing, 1 MB of doubles
+
+def dataset_layout(axes, chunks=None, compression='gzip'):
+    """Returns the h5py create_dataset() keyword arguments to store data on the grid described by axes.
+
+    chunks       None or 'auto' for the default chunk shape, a tuple of chunk lengths (or a string like '16,16,64'),
+                 or the label or index of an axis to optimize for reading slices along that axis, e.g. by 'binoculars fit'
+    compression  see compression_options()"""
+    layout = compression_options(compression)
+    shape = axes.shape
+    if isinstance(chunks, basestring):
+        if chunks.strip().lower() == 'auto':
+            chunks = None
+        elif all(item.strip().isdigit() for item in chunks.split(',')):
+            chunks = util.parse_tuple(chunks, type=int)
+    if chunks is None:
+        return layout
+    if isinstance(chunks, (tuple, list)):
+        if len(chunks) != len(shape) or any(length < 1 for length in chunks):
+            raise ValueError('invalid chunk shape {0!r} for a {1}-dimensional Space'.format(chunks, len(shape)))
+        layout['chunks'] = tuple(min(length, size) for length, size in zip(chunks, shape))
+    else:
+        # a single grid point thick along the slicing axis, as wide as possible across the others
+        index = axes.index(chunks)
+        layout['chunks'] = chunk_shape(shape[:index] + (1,) + shape[index+1:], slice_chunksize)
+    return layout
+
+def pyramid_level(fp, resolution=None):
+    """Returns the group of the open HDF5 file fp holding the coarsest pyramid level (see write_pyramid())
+    with resolutions at least as fine as resolution, a number or one per axis. Returns fp itself for the full data."""
+    if resolution is None or 'pyramid' not in fp:
+        return fp
+    axes = Axes.fromfile(fp)
+    if isinstance(resolution, numbers.Number):
+        resolution = (resolution,) * len(axes)
+    if len(resolution) != len(axes):
+        raise ValueError('dimensionality of resolution does not match dimensionality of Space in HDF5 file')
+    best, bestfactor = fp, 1
+    for name, group in fp['pyramid'].iteritems():
+        factor = int(name)
+        if factor > bestfactor and all(ax.res * factor <= res * (1 + 1e-9) for ax, res in zip(axes, resolution)):
+            best, bestfactor = group, factor
+    return best
+
+def trimmed_key(key, bounds, shape):
+    """Returns the index key (slices and integers) restricted to the bounds, (first, last) index per axis,
+    or None if nothing is left."""
+    newkey = []
+    for k, (lower, upper), size in zip(key, bounds, shape):
+        if isinstance(k, slice):
+            start, stop = k.indices(size)[:2]
+            k = slice(max(start, lower), min(stop, upper + 1))
+            if k.start >= k.stop:
+                return None
+        newkey.append(k)
+    return tuple(newkey)
+
+def block_shape(dataset, lengths, blocksize=2**20):
+    """Returns a shape of about blocksize elements made of whole HDF5 chunks of dataset, for reading a region
+    of the given lengths. The chunks are doubled along the last axes first, up to the lengths."""
+    block = list(dataset.chunks or chunk_shape(dataset.shape, slice_chunksize))
+    for i in reversed(range(len(block))):
+        while block[i] < lengths[i] and numpy.prod(block) * 2 <= blocksize:
+            block[i] *= 2
+    return tuple(block)
+
+def read_data(group, key, projected=()):
+    """Returns the photons and contributions arrays of the Space stored in the HDF5 group, indexed by key
+    (an n-tuple of slices and integers), summed over the axes projected while reading, see read_summed()."""
+    counts, contributions = group['counts'], group['contributions']
+    if projected:
+        return tuple(read_summed(dataset, key, projected) for dataset in (counts, contributions))
+    shape = tuple(len(xrange(*k.indices(size))) for k, size in zip(key, counts.shape) if isinstance(k, slice))
+    photons = numpy.zeros(shape, dtype=counts.dtype)
+    counts.read_direct(photons, key)
+    contribs = numpy.zeros(shape, dtype=contributions.dtype)
+    contributions.read_direct(contribs, key)
+    return photons, contribs
+
+def read_summed(dataset, key, axes, blocksize=2**20):
+    """Returns dataset[key] summed over axes, reading blocks of whole HDF5 chunks of about blocksize elements.
+
+    dataset     h5py dataset
+    key         n-tuple of slices and integers, as index key
+    axes        indices of the dimensions of dataset to sum over, not indexed by an integer in key"""
+    key = tuple(k.indices(size)[:2] if isinstance(k, slice) else k for k, size in zip(key, dataset.shape))
+    bounds = tuple((k, k + 1) if isinstance(k, numbers.Integral) else k for k in key)
+    block = block_shape(dataset, tuple(hi - lo for lo, hi in bounds), blocksize)
+    kept = tuple(i for i, k in enumerate(key) if not isinstance(k, numbers.Integral))
+    sumaxes = tuple(kept.index(i) for i in axes)
+    resultkeep = tuple(i for i in kept if i not in axes)
+    dtype = numpy.zeros((1,), dtype=dataset.dtype).sum(axis=0).dtype
+    result = numpy.zeros(tuple(bounds[i][1] - bounds[i][0] for i in resultkeep), dtype=dtype)
+    ranges = tuple(tuple((max(lo, start), min(hi, start + size)) for start in xrange(lo - lo % size, hi, size)) for (lo, hi), size in zip(bounds, block))
+    for blockranges in itertools.product(*ranges):
+        srckey = tuple(k if isinstance(k, numbers.Integral) else slice(*r) for k, r in zip(key, blockranges))
+        dstkey = tuple(slice(blockranges[i][0] - bounds[i][0], blockranges[i][1] - bounds[i][0]) for i in resultkeep)
+        result[dstkey] += dataset[srckey].sum(axis=sumaxes)
+    return result
+
+def resample_maps(axes, resolutions):
+    """Returns the Axes for the new resolutions and, per axis, an integer array with the index of
+    the nearest new grid point for every old grid point. Used by rebin2()."""
+    newaxes, maps = [], []
+    for ax, res in zip(axes, resolutions):
+        coords = (numpy.arange(len(ax)) + ax.imin) * ax.res
+        newax = Axis(coords.min(), coords.max(), res, ax.label)
+        newaxes.append(newax)
+        maps.append(numpy.around(coords / newax.res).astype(int) - newax.imin)
+    return Axes(newaxes), tuple(maps)
+
+def resample_array(array, maps, dtype=None):
+    """Sums the elements of array that map to the same index, one axis at a time. maps are
+    non-decreasing index arrays, see resample_maps(). Returns the result and the index of its first element."""
+    origin = []
+    for axis, indices in enumerate(maps):
+        unique, starts = numpy.unique(indices, return_index=True)
+        array = numpy.add.reduceat(array, starts, axis=axis, dtype=dtype)
+        if unique[-1] - unique[0] + 1 != unique.size: # new grid points in between without data
+            shape = list(array.shape)
+            shape[axis] = unique[-1] - unique[0] + 1
+            spread = numpy.zeros(shape, dtype=array.dtype)
+            spread[(slice(None),) * axis + (unique - unique[0],)] = array
+            array = spread
+        origin.append(unique[0])
+    return array, tuple(origin)
+
+def finite_data(coordinates, intensity):
+    """Returns the coordinates and intensity of the pixels with finite intensity as 1D arrays, without copying if all are finite."""
+    valid = numpy.isfinite(intensity)
+    if valid.all():
+        return tuple(coord.ravel() for coord in coordinates), intensity.ravel()
+    return tuple(coord[valid] for coord in coordinates), intensity[valid]
+
+def flat_indices(axes, coordinates):
+    """Returns the flat (C-order) grid indices of 1D coordinate arrays, raises ValueError if outside axes.
+
+    Computed in a single pass over the axes using one float scratch array; the result is int32 when the grid is small enough."""
+    dtype = numpy.int32 if axes.npoints < 2**31 else numpy.int64
+    flat = numpy.zeros(coordinates[0].shape, dtype=dtype)
+    scratch = numpy.empty(coordinates[0].shape)
+    stride = 1
+    for ax, coord in reversed(zip(axes, coordinates)):
+        numpy.divide(coord, ax.res, out=scratch)
+        numpy.around(scratch, out=scratch)
+        if not ax.imin <= scratch.min() <= scratch.max() <= ax.imax: # also catches nan
+            raise ValueError('cannot get indices, values from [{0}, {1}], axes range [{2}, {3}]'.format(coord.min(), coord.max(), ax.min, ax.max))
+        scratch -= ax.imin
+        if stride != 1:
+            scratch *= stride
+        numpy.add(flat, scratch, out=flat, casting='unsafe')
+        stride *= len(ax)
+    return flat
+
+def grow_axis(capacity, axis, headroom):
+    """Returns an axis covering both capacity and axis, with headroom (a fraction of the length of axis)
+    added on the sides where axis exceeds capacity."""
+    extra = int(numpy.ceil(len(axis) * headroom))
+    imin = axis.imin - extra if axis.imin < capacity.imin else capacity.imin
+    imax = axis.imax + extra if axis.imax > capacity.imax else capacity.imax
+    return capacity.rebound(imin, imax)
+
+def chunk_shape(shape, size):
+    """Returns a chunk shape of (approximately) at most size elements for an array of the given shape.
+    The largest dimension is halved until the chunk is small enough."""
+    chunk = list(max(length, 1) for length in shape)
+    while numpy.prod(chunk) > size and max(chunk) > 1:
+        i = chunk.index(max(chunk))
+        chunk[i] = -(-chunk[i] // 2)
+    return tuple(chunk)
+
+def chunk_keys(shape, chunkshape):
+    """Yields the index keys of all chunks of an array."""
+    for chunkkey in itertools.product(*(xrange(-(-size // chunk)) for size, chunk in zip(shape, chunkshape))):
+        yield chunk_slices(chunkkey, shape, chunkshape)
+
+def chunk_slices(chunkkey, shape, chunkshape):
+    """Returns the index key of a chunk, given its position in the chunk grid."""
+    return tuple(slice(i * chunk, min((i + 1) * chunk, size)) for i, size, chunk in zip(chunkkey, shape, chunkshape))
+
+def chunk_groups(coords, shape, chunkshape):
+    """Group grid points by the chunk they fall in.
+
+    coords      n-tuple of integer index arrays
+    shape       shape of the grid
+    chunkshape  shape of a chunk
+
+    Yields (chunkkey, positions) tuples, where chunkkey is the position of the chunk
+    in the chunk grid and positions indexes the grid points (in coords) it contains."""
+    chunkcount = tuple(-(-size // chunk) for size, chunk in zip(shape, chunkshape))
+    chunkids = numpy.ravel_multi_index(tuple(coord // chunk for coord, chunk in zip(coords, chunkshape)), chunkcount)
+    order = numpy.argsort(chunkids, kind='mergesort')
+    for group in numpy.split(order, numpy.flatnonzero(numpy.diff(chunkids[order])) + 1):
+        if group.size:
+            yield tuple(int(coord[group[0]]) // chunk for coord, chunk in zip(coords, chunkshape)), group
+
 def union_axes(axes):
     axes = tuple(axes)
     if len(axes) == 1:
@@ -719,20 +2468,150 @@ def sum(spaces):
 
     first = spaces[0]
     axes = tuple(union_axes(space.axes[i] for space in spaces) for i in range(first.dimension))
-    newspace = first.__class__(axes)
+    newspace = first.__class__(axes, dtype=reduce(common_dtype, (space.dtype for space in spaces)))
     for space in spaces:
         newspace += space
     return newspace
 
 # hybrid sum() / __iadd__()
-def chunked_sum(spaces, chunksize=10):
+def accumulate(total, space):
+    """Adds space to the running sum total, in place where possible, and returns the new sum. Start with an EmptySpace(),
+    a dense sum is kept in an Accumulator such that it grows without reallocating every time (use compact() at the end).
+    None and EmptySpace() are skipped."""
+    if space is None or isinstance(space, EmptySpace):
+        return total
+    if isinstance(total, EmptySpace):
+        return Accumulator.from_space(space) if space.__class__ is Space else space
+    total += space
+    return total
+
+def chunked_sum(spaces, chunksize=10, cls=None):
     """Calculate sum of iterable of Space instances. Creates intermediate sums to avoid growing a large space at every summation.
 
     spaces     iterable of Space instances
-    chunksize  number of Space instances in each intermediate sum"""
+    chunksize  number of Space instances in each intermediate sum
+    cls        optional Space class of the result, e.g. HDF5Space, the intermediate sums keep the class of the input"""
     result = EmptySpace()
     for chunk in util.grouper(spaces, chunksize):
-        result += sum(space for space in chunk)
+        chunk = sum(space for space in chunk)
+        if cls is not None:
+            chunk = cls.from_space(chunk)
+        if isinstance(result, EmptySpace) and chunk.__class__ is Space:
+            result = Accumulator.from_space(chunk) # grows without reallocating at every summation
+        else:
+            result += chunk
+    if isinstance(result, Accumulator):
+        result = result.compact()
+    return result
+
+class ImageBinner(object):
+    """Bins image data straight into a single growing Accumulator, without creating a Space per image.
+    Images are added one by one with add(), result() returns the binned Space. See bin_images() for the arguments."""
+    def __init__(self, resolutions, labels, axes=None, limits=None, cls=None, chunksize=25, dtype=None):
+        self.resolutions = resolutions
+        self.labels = labels
+        self.limits = limits
+        if limits is not None:
+            self.bounds = limit_bounds(limits, resolutions)
+            axes = limit_axes(limits, resolutions, labels) or axes
+        self.axes = axes
+        self.cls = cls
+        self.chunksize = chunksize
+        self.dtype = dtype
+        self.flush = cls not in (None, Space, Accumulator)
+        self.accumulator = None
+        self.space = EmptySpace()
+        self.count = 0
+
+    def add(self, coordinates, intensity):
+        if self.limits is not None:
+            coordinates, intensity = apply_limits(self.bounds, self.resolutions, coordinates, intensity)
+            if not intensity.size:
+                return
+        imageaxes = Axes(Axis(coord.min(), coord.max(), res, label) for res, label, coord in zip(self.resolutions, self.labels, coordinates))
+        if self.limits is not None: # Axis rounds outwards, which could exceed the limits by one step
+            imageaxes = Axes(ax.rebound(ax.imin if lo is None else max(ax.imin, lo), ax.imax if hi is None else min(ax.imax, hi)) for ax, (lo, hi) in zip(imageaxes, self.bounds))
+        if self.accumulator is None:
+            if self.axes is not None and not self.flush: # allocated with exactly these axes, without headroom (otherwise the result is preallocated instead)
+                self.accumulator = Accumulator(self.axes, dtype=self.dtype)
+            else:
+                self.accumulator = Accumulator(imageaxes, dtype=self.dtype)
+        self.accumulator.extend(imageaxes)
+        self.accumulator.process_image(coordinates, intensity)
+        self.count += 1
+        if self.flush and self.count % self.chunksize == 0:
+            self.space = _flush_accumulator(self.space, self.accumulator, self.cls, self.axes)
+            self.accumulator = None
+
+    def result(self):
+        """Returns the binned Space, EmptySpace if no data was added."""
+        if self.accumulator is not None:
+            if self.flush:
+                self.space = _flush_accumulator(self.space, self.accumulator, self.cls, self.axes)
+            else:
+                self.space = self.accumulator.compact()
+            self.accumulator = None
+        return self.space
+
+    def discard(self):
+        """Drops the data binned so far, removing the scratch file of a partial HDF5Space result."""
+        if isinstance(self.space, HDF5Space):
+            self.space.close()
+        self.space = EmptySpace()
+        self.accumulator = None
+
+def bin_images(images, resolutions, labels, axes=None, limits=None, cls=None, chunksize=25, dtype=None):
+    """Bin image data straight into a single growing Accumulator, without creating a Space per image.
+
+    images       iterable of (coordinates, intensity) tuples, see Space.process_image()
+    resolutions  n-tuple of axis resolutions
+    labels       n-tuple of axis labels
+    axes         optional Axes instance to preallocate, e.g. the expected extent of all images
+    limits       optional n-tuple of (min, max) pairs, None for unbounded, data outside is discarded.
+                 If all axes are bounded, the output is allocated once with exactly these limits.
+    cls          optional Space class of the result, e.g. HDF5Space
+    chunksize    for non-dense result classes, the Accumulator is emptied into the result every chunksize images
+    dtype        optional (photons, contributions) dtypes, see get_dtype()"""
+    binner = ImageBinner(resolutions, labels, axes=axes, limits=limits, cls=cls, chunksize=chunksize, dtype=dtype)
+    for coordinates, intensity in images:
+        binner.add(coordinates, intensity)
+    return binner.result()
+
+def limit_bounds(limits, resolutions):
+    """Converts an n-tuple of (min, max) limits to integer grid bounds, rounding outwards as in Axis. None stays unbounded."""
+    bounds = []
+    for pair, res in zip(limits, resolutions):
+        lo, hi = (None, None) if pair is None else pair
+        bounds.append((None if lo is None else int(numpy.floor(lo / res)), None if hi is None else int(numpy.ceil(hi / res))))
+    return tuple(bounds)
+
+def limit_axes(limits, resolutions, labels):
+    """Returns the Axes described by limits if all axes are bounded, otherwise None."""
+    bounds = limit_bounds(limits, resolutions)
+    if all(None not in pair for pair in bounds):
+        return Axes(Axis(lo, hi, res, label) for (lo, hi), res, label in zip(bounds, resolutions, labels))
+
+def apply_limits(bounds, resolutions, coordinates, intensity):
+    """Discard data points outside integer grid bounds, see limit_bounds(). Returns the remaining (coordinates, intensity) as 1D arrays."""
+    valid = numpy.ones(intensity.shape, dtype=bool)
+    for (lo, hi), res, coord in zip(bounds, resolutions, coordinates):
+        if lo is None and hi is None:
+            continue
+        index = numpy.around(coord / res)
+        if lo is not None:
+            valid &= index >= lo
+        if hi is not None:
+            valid &= index <= hi
+    if valid.all():
+        return tuple(coord.ravel() for coord in coordinates), intensity.ravel()
+    return tuple(coord[valid] for coord in coordinates), intensity[valid]
+
+def _flush_accumulator(result, accumulator, cls, axes=None):
+    if isinstance(result, EmptySpace):
+        if axes is None:
+            return cls.from_space(accumulator)
+        result = cls(axes, dtype=accumulator.dtype)
+    result += accumulator
     return result
 
 def iterate_over_axis(space, axis, resolution = None):
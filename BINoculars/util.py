@@ -1,5 +1,6 @@
 import os
 import sys
+import ast
 import gzip
 import itertools
 import random
@@ -7,6 +8,7 @@ import cPickle as pickle
 import inspect
 import time
 import copy
+import operator
 import numpy
 import contextlib
 import argparse
@@ -66,7 +68,7 @@ def parse_transform_args(transform):
         yield ax.strip(), float(res), expr.strip()
 
 
-def handle_ordered_operations(space, args, auto3to2=False):
+def handle_ordered_operations(space, args, auto3to2=False, load=True):
     info = []
     for command, opts in getattr(args, 'ordered_operations', []):
 
@@ -110,7 +112,7 @@ def handle_ordered_operations(space, args, auto3to2=False):
             labels, resolutions, exprs = zip(*parse_transform_args(opts))
             transformation = transformation_from_expressions(space, exprs)
             info.append('transformed to {0}'.format(', '.join('{0} = {1}'.format(label, expr) for (label, expr) in zip(labels, exprs))))
-            space = space.transform_coordinates(resolutions, labels, transformation)
+            space = space.transform_coordinates(resolutions, labels, transformation, threads=getattr(args, 'threads', 1))
     
         elif command == 'rebin':
             if ',' in opts:
@@ -123,10 +125,14 @@ def handle_ordered_operations(space, args, auto3to2=False):
             raise ValueError("unsported Ordered Operation '{0}'".format(command))
 
     if auto3to2 and space.dimension == 3: # automatic projection on smallest axis
-        projectaxis = numpy.argmin(space.photons.shape)
+        projectaxis = numpy.argmin(space.axes.shape)
         info.append('projected on {0}'.format(space.axes[projectaxis].label))
         space = space.project(projectaxis)
 
+    from space import LazySpace
+    if load and isinstance(space, LazySpace): # read only the final result
+        space = space.load()
+
     return space, info
 
 
@@ -282,9 +288,34 @@ def parse_multi_range(s):
 def parse_tuple(s, length=None, type=str):
     t = tuple(type(i) for i in s.split(','))
     if length is not None and len(t) != length:
-        raise ValueError('invalid tuple length: expected {0} got {0}'.format(length, len(t)))
+        raise ValueError('invalid tuple length: expected {0} got {1}'.format(length, len(t)))
     return t
 
+def parse_pairs(s):
+    """Parses numpy slice-like pairs, e.g. '[0:4,-1:1,:]' gives ((0., 4.), (-1., 1.), (None, None))"""
+    s = s.strip()
+    if s.startswith('[') and s.endswith(']'):
+        s = s[1:-1]
+    pairs = []
+    for item in s.split(','):
+        if item.count(':') != 1:
+            raise ValueError("invalid pair '{0}', expected 'min:max'".format(item.strip()))
+        pair = tuple(float(i) if i.strip() else None for i in item.split(':'))
+        if None not in pair and pair[0] > pair[1]:
+            raise ValueError("invalid pair '{0}', min larger than max".format(item.strip()))
+        pairs.append(pair)
+    return tuple(pairs)
+
+def parse_bytes(s):
+    """Parses a size in bytes with an optional unit, e.g. '512MB' or '4G'"""
+    units = 'kmgt'
+    s = s.strip().lower()
+    if s.endswith('b'):
+        s = s[:-1]
+    if s and s[-1] in units:
+        return int(float(s[:-1]) * 1024**(units.index(s[-1]) + 1))
+    return int(s)
+
 def parse_bool(s):
     l = s.lower()
     if l in ('1', 'true', 'yes', 'on'):
@@ -466,7 +497,7 @@ def space_to_txt(space, filename):
 
 @contextlib.contextmanager
 def open_h5py(file, mode):
-    if isinstance(file, h5py.File):
+    if isinstance(file, h5py.Group):
         yield file
     else:
         with h5py.File(file, mode) as fp:
@@ -534,11 +565,198 @@ def loop_delayer(delay):
     return generator()
 
 def transformation_from_expressions(space, exprs):
-    def transformation(*coords):
-        ns = dict((i, getattr(numpy, i)) for i in dir(numpy))
-        ns.update(**dict((ax.label, coord) for ax, coord in zip(space.axes, coords)))
-        return tuple(eval(expr, ns) for expr in exprs)
-    return transformation
+    """Returns a function of the coordinate arrays of the axes of space, evaluating exprs, see compile_expressions()."""
+    return compile_expressions(tuple(ax.label for ax in space.axes), exprs)
+
+_expression_cache = {}
+
+def compile_expressions(labels, exprs):
+    """Returns an ExpressionProgram evaluating exprs as functions of the variables named by labels.
+    Programs are cached, compiling the same expressions again is free."""
+    key = tuple(labels), tuple(exprs)
+    if key not in _expression_cache:
+        if len(_expression_cache) > 100:
+            _expression_cache.clear()
+        _expression_cache[key] = ExpressionProgram(*key)
+    return _expression_cache[key]
+
+
+class ExpressionProgram(object):
+    """Python expressions on arrays, like 'sqrt(H**2+K**2+L**2)', compiled once into a list of numpy operations.
+
+    All numpy functions and constants can be used without 'numpy.'. Subexpressions that occur more than
+    once, within one expression or across the expressions, are evaluated once, subexpressions without
+    variables are evaluated at compile time. Temporaries of arithmetic ufuncs are reused as output where
+    possible. If all operations work elementwise, large inputs are evaluated in blocks of about
+    blocksize elements, keeping the temporaries small. Expressions using other syntax, e.g. indexing,
+    are evaluated by eval() instead.
+
+    Calling the program with one array per label returns a tuple with the value of every expression, like eval():
+    a constant expression gives the constant itself, not an array, and every expression gives a separate array."""
+
+    blocksize = 2**18
+    _binops = {ast.Add: (numpy.add, operator.add), ast.Sub: (numpy.subtract, operator.sub), ast.Mult: (numpy.multiply, operator.mul),
+               ast.Div: (numpy.divide, operator.div), ast.FloorDiv: (numpy.floor_divide, operator.floordiv),
+               ast.Mod: (numpy.remainder, operator.mod), ast.Pow: (numpy.power, operator.pow)}
+    _unaryops = {ast.USub: (numpy.negative, operator.neg), ast.UAdd: (numpy.positive if hasattr(numpy, 'positive') else operator.pos, operator.pos)}
+    _compareops = {ast.Lt: (numpy.less, operator.lt), ast.LtE: (numpy.less_equal, operator.le), ast.Gt: (numpy.greater, operator.gt),
+                   ast.GtE: (numpy.greater_equal, operator.ge), ast.Eq: (numpy.equal, operator.eq), ast.NotEq: (numpy.not_equal, operator.ne)}
+    _elementwise = 'UAdd', 'ones_like', 'zeros_like', 'where', 'clip' # operations that are not ufuncs but work elementwise
+    _inplace = frozenset(getattr(numpy, name) for name in ( # ufuncs returning the dtype of their floating point operands
+        'add', 'subtract', 'multiply', 'divide', 'true_divide', 'floor_divide', 'remainder', 'fmod', 'power', 'negative',
+        'absolute', 'fabs', 'sqrt', 'square', 'reciprocal', 'exp', 'exp2', 'expm1', 'log', 'log2', 'log10', 'log1p',
+        'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'arctan2', 'hypot', 'sinh', 'cosh', 'tanh', 'arcsinh',
+        'arccosh', 'arctanh', 'deg2rad', 'rad2deg', 'degrees', 'radians', 'floor', 'ceil', 'trunc', 'rint',
+        'maximum', 'minimum', 'fmax', 'fmin'))
+    _namespace = None
+
+    def __init__(self, labels, exprs):
+        self.labels = tuple(labels)
+        self.exprs = tuple(exprs)
+        if ExpressionProgram._namespace is None:
+            ExpressionProgram._namespace = dict((name, getattr(numpy, name)) for name in dir(numpy))
+        self.namespace = dict(self._namespace)
+        self.namespace.update((label, None) for label in self.labels)
+        try:
+            self._compile()
+        except (SyntaxError, ValueError, KeyError, TypeError):
+            self.ops = None # evaluate with eval(), raising the same errors as before
+            self.code = tuple(compile(expr, '<expression>', 'eval') for expr in self.exprs)
+
+    def _compile(self):
+        self.constants = [] # values of the constant slots
+        self.ops = [] # (function, argument slots, keyword arguments, in place) producing one slot each
+        self.elementwise = True
+        self._slots = {} # structural key of a subexpression -> (slot, is constant)
+        self.outputs = tuple(self._node(ast.parse(expr.strip(), mode='eval').body) for expr in self.exprs)
+
+        # slots 0..n-1 are the inputs, followed by the constants and the results of the operations
+        nconst = len(self.labels)
+        nops = nconst + len(self.constants)
+        resolve = lambda ref: ref[1] + (nconst if ref[0] == 'const' else nops if ref[0] == 'op' else 0)
+        self.ops = [(func, tuple(resolve(arg) for arg in args), kwargs, inplace) for func, args, kwargs, inplace in self.ops]
+        self.outputs = tuple(resolve(ref) for ref in self.outputs)
+        self.first_op = nops
+        self.last_use = {}
+        for i, (func, args, kwargs, inplace) in enumerate(self.ops):
+            for arg in args:
+                self.last_use[arg] = i
+        # temporaries that are freshly allocated by ufuncs (not views of the inputs) and are not returned
+        self.reusable = frozenset(nops + i for i, op in enumerate(self.ops) if op[3]) - frozenset(self.outputs)
+        del self._slots
+
+    def _node(self, node):
+        """Compiles an AST node, returns its slot reference: ('input' | 'const' | 'op', index)."""
+        if isinstance(node, ast.Name):
+            if node.id in self.labels:
+                return self._slot(('name', node.id), ('input', self.labels.index(node.id)))
+            return self._constant(('name', node.id), self._namespace[node.id])
+        elif isinstance(node, ast.Num):
+            return self._constant(('num', type(node.n), node.n), node.n)
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow) and isinstance(node.right, ast.Num) and node.right.n == 2:
+            return self._operation('square', (numpy.square, lambda x: x ** 2), (node.left,)) # as ndarray.__pow__ does
+        elif isinstance(node, ast.BinOp) and type(node.op) in self._binops:
+            return self._operation(type(node.op).__name__, self._binops[type(node.op)], (node.left, node.right))
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in self._unaryops:
+            return self._operation(type(node.op).__name__, self._unaryops[type(node.op)], (node.operand,))
+        elif isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in self._compareops:
+            return self._operation(type(node.ops[0]).__name__, self._compareops[type(node.ops[0])], (node.left, node.comparators[0]))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id not in self.labels and not node.starargs and not node.kwargs:
+            func = self._namespace[node.func.id]
+            kwargs = tuple((keyword.arg, self._constant_value(keyword.value)) for keyword in node.keywords)
+            return self._operation(node.func.id, (func, func), node.args, kwargs)
+        raise ValueError('unsupported expression syntax')
+
+    def _constant_value(self, node):
+        ref = self._node(node)
+        if ref[0] != 'const':
+            raise ValueError('keyword arguments must be constant')
+        return self.constants[ref[1]]
+
+    def _slot(self, key, ref):
+        self._slots.setdefault(key, ref)
+        return self._slots[key]
+
+    def _constant(self, key, value):
+        if key not in self._slots:
+            self.constants.append(value)
+            self._slots[key] = ('const', len(self.constants) - 1)
+        return self._slots[key]
+
+    def _operation(self, name, (func, pyfunc), argnodes, kwargs=()):
+        args = tuple(self._node(arg) for arg in argnodes)
+        key = ('op', name, args, kwargs)
+        if key in self._slots:
+            return self._slots[key]
+        if all(arg[0] == 'const' for arg in args): # fold, using Python semantics as eval() would
+            return self._constant(key, pyfunc(*(self.constants[arg[1]] for arg in args), **dict(kwargs)))
+        if not isinstance(func, numpy.ufunc) and name not in self._elementwise:
+            self.elementwise = False
+        self.ops.append((func, args, dict(kwargs), func in self._inplace and not kwargs))
+        return self._slot(key, ('op', len(self.ops) - 1))
+
+    def __call__(self, *coords):
+        if len(coords) != len(self.labels):
+            raise ValueError('expected {0} coordinate arrays, got {1}'.format(len(self.labels), len(coords)))
+        if self.ops is None:
+            namespace = dict(self.namespace)
+            namespace.update(zip(self.labels, coords))
+            return tuple(eval(code, namespace) for code in self.code)
+
+        coords = tuple(numpy.asarray(coord) for coord in coords)
+        shape = coords[0].shape if coords else ()
+        if not self.elementwise or not shape or any(coord.shape != shape for coord in coords) or coords[0].size <= self.blocksize:
+            return self._results(self._evaluate(coords))
+
+        # evaluate blocks of whole rows along the first axis, then the inputs never have to be copied
+        rows = max(1, self.blocksize * shape[0] // coords[0].size)
+        values = list(coords) + self.constants + [None] * len(self.ops)
+        for start in xrange(0, shape[0], rows):
+            blockvalues = self._evaluate(tuple(coord[start:start+rows] for coord in coords))
+            for output in self.outputs:
+                if output >= self.first_op:
+                    if values[output] is None:
+                        values[output] = numpy.empty(shape, dtype=numpy.asarray(blockvalues[output]).dtype)
+                    values[output][start:start+rows] = blockvalues[output]
+        return self._results(values)
+
+    def _results(self, values):
+        """The value of every expression from the values of all slots. Arrays that would be returned more
+        than once and constant arrays are copied, such that every expression gives a separate array."""
+        results = []
+        for i, output in enumerate(self.outputs):
+            value = values[output]
+            if isinstance(value, numpy.ndarray) and (output in self.outputs[:i] or len(self.labels) <= output < self.first_op):
+                value = value.copy()
+            results.append(value)
+        return tuple(results)
+
+    def _evaluate(self, coords):
+        values = list(coords) + self.constants + [None] * len(self.ops)
+        for i, (func, args, kwargs, inplace) in enumerate(self.ops):
+            operands = tuple(values[arg] for arg in args)
+            out = None
+            if inplace:
+                for arg in args: # reuse a temporary that is not needed anymore
+                    if arg in self.reusable and self.last_use[arg] == i and self._fits(values[arg], operands):
+                        out = values[arg]
+                        break
+            if out is not None:
+                values[self.first_op + i] = func(*operands, out=out, **kwargs)
+            else:
+                values[self.first_op + i] = func(*operands, **kwargs)
+            for arg in args:
+                if arg >= self.first_op and arg not in self.outputs and self.last_use[arg] == i:
+                    values[arg] = None
+        return values
+
+    @staticmethod
+    def _fits(array, operands):
+        """True if the result of an in place ufunc on operands can be stored in array."""
+        if not isinstance(array, numpy.ndarray) or array.dtype.kind not in 'fc':
+            return False
+        shape = numpy.broadcast(*operands).shape if len(operands) > 1 else numpy.shape(operands[0])
+        return array.shape == shape and array.dtype == numpy.result_type(*operands)
 
 
 def format_bytes(bytes):
@@ -3,6 +3,7 @@
 import sys
 import os
 import argparse
+import multiprocessing
 import numpy
 
 import BINoculars.space, BINoculars.util
@@ -13,6 +14,7 @@ def command_info(args):
     parser.add_argument('infile', nargs='+', help='input files, must be .hdf5')
     parser.add_argument("--config", help="display config used to generate the hdf5 file", action='store_true')
     parser.add_argument("--extractconfig", help="save config used to generate the hdf5 file in a new text file", action='store', dest='output')
+    parser.add_argument("--statistics", help="display statistics of the data, computed from the data for files without stored statistics", action='store_true')
     args = parser.parse_args(args)
 
     if args.output:
@@ -28,6 +30,15 @@ def command_info(args):
                 print '{0}: unable to load Space: {1!r}'.format(f, e)
             else:
                 print '{0} \n{1!r}'.format(f, axes)
+            try:
+                statistics = BINoculars.space.Statistics.fromfile(f, compute=args.statistics)
+            except Exception as e:
+                print '{0}: unable to load statistics: {1!r}'.format(f, e)
+            else:
+                if statistics is not None:
+                    print '{0!r}'.format(statistics)
+                    if statistics.bounds is not None:
+                        print 'data within {0}'.format(', '.join('{0} [{1}, {2}]'.format(ax.label, ax[lower], ax[upper]) for ax, (lower, upper) in zip(axes, statistics.bounds)))
             if args.config:
                 try:
                     config = BINoculars.util.ConfigFile.fromfile(f)
@@ -43,6 +54,12 @@ def command_convert(args):
     parser.add_argument('--wait', action='store_true', help='wait for input files to appear')
     BINoculars.util.argparse_common_arguments(parser, 'project', 'slice', 'pslice', 'rebin', 'transform', 'subtract')
     parser.add_argument('--read-trusted-zpi', action='store_true', help='read legacy .zpi files, ONLY FROM A TRUSTED SOURCE!')
+    parser.add_argument('--storage', choices=sorted(BINoculars.space.storage_classes), default='dense', help="how to hold the data while converting, 'hdf5' keeps it on disk such that e.g. --rebin works on files larger than memory (default: dense)")
+    parser.add_argument('--pyramid', type=int, default=0, metavar='N', help='store N successively 2x coarser copies in the .hdf5 output for quick browsing, see plot --resolution (default: 0)')
+    parser.add_argument('--projections', action='store_true', help='store the projections onto every axis and pair of axes in the .hdf5 output for quick previews')
+    parser.add_argument('--rechunk', default=None, metavar='AXIS|N,M,...', help='HDF5 chunk shape of the .hdf5 output: an axis label to optimize reading slices along that axis (e.g. for binoculars fit), or the chunk lengths (default: auto)')
+    parser.add_argument('--compression', default='gzip', metavar='FILTER', help="HDF5 compression of the .hdf5 output: none, lzf, gzip or gzip:LEVEL, optionally followed by ',shuffle' (default: gzip)")
+    parser.add_argument('--threads', type=int, default=multiprocessing.cpu_count(), help='number of threads compressing the .hdf5 output (default: number of cores)')
     parser.add_argument('infile', help='input file, must be a .hdf5')
     parser.add_argument('outfile', help='output file, can be .hdf5 or .edf or .txt')
 
@@ -58,8 +75,10 @@ def command_convert(args):
             print 'error: .zpi files are unsafe, use --read-trusted-zpi to open'
             sys.exit(1)
         space = BINoculars.util.zpi_load(args.infile)
+    elif args.storage == 'dense' and not args.subtract:
+        space = BINoculars.space.LazySpace.fromfile(args.infile) # slices and projections are applied while reading
     else:
-        space = BINoculars.space.Space.fromfile(args.infile)
+        space = BINoculars.space.storage_classes[args.storage].fromfile(args.infile)
     ext = os.path.splitext(args.outfile)[-1]
 
     if args.subtract:
@@ -76,7 +95,7 @@ def command_convert(args):
         print 'saved at {0}'.format(args.outfile)
 
     elif ext == '.hdf5':
-        space.tofile(args.outfile)
+        space.tofile(args.outfile, pyramid=args.pyramid, projections=args.projections, chunks=args.rechunk, compression=args.compression, threads=args.threads)
         print 'saved at {0}'.format(args.outfile)
 
     else:
@@ -95,13 +114,20 @@ def command_plot(args):
     parser.add_argument('--multi', default=None, choices=('grid', 'stack'))
     parser.add_argument('--fit', default = None)
     parser.add_argument('--guess', default = None)
+    parser.add_argument('--resolution', default=None, metavar='R[,R2,...]', help='load the coarsest stored pyramid level at least this fine instead of the full data, one value or one per axis')
     args = parser.parse_args(args)
 
     if args.subtract:
-        subtrspace = BINoculars.space.Space.fromfile(args.subtract)
+        subtrspace = BINoculars.space.LazySpace.fromfile(args.subtract)
         subtrspace, subtrinfo = BINoculars.util.handle_ordered_operations(subtrspace, args, auto3to2=True)
         args.nolog = True
 
+    resolution = None
+    if args.resolution is not None:
+        resolution = tuple(float(r) for r in args.resolution.split(','))
+        if len(resolution) == 1:
+            resolution = resolution[0]
+
     guess = []
     if args.guess is not None:
         for n in args.guess.split(','):
@@ -114,8 +140,12 @@ def command_plot(args):
     plotrows = int(numpy.ceil(float(plotcount) / plotcolumns))
 
     for i, filename in enumerate(args.infile):
-        space = BINoculars.space.Space.fromfile(filename)
-        space, info = BINoculars.util.handle_ordered_operations(space, args, auto3to2=True)
+        space = BINoculars.space.LazySpace.fromfile(filename, resolution=resolution)
+        space, info = BINoculars.util.handle_ordered_operations(space, args, auto3to2=True, load=False)
+        statistics = None
+        if isinstance(space, BINoculars.space.LazySpace):
+            statistics = space.statistics()
+            space = space.load()
 
         fitdata = None
         if args.fit:
@@ -144,7 +174,10 @@ def command_plot(args):
 
         if args.multi == 'grid':
             pyplot.subplot(plotrows, plotcolumns, i+1)
-        BINoculars.plot.plot(space, pyplot.gcf(), pyplot.gca(), label=basename, log=not args.nolog, clipping=float(args.clip), fit=fitdata)
+        norm = None
+        if statistics is not None and space.dimension == 2 and not args.subtract: # color scale from the stored statistics
+            norm = BINoculars.plot.get_clipped_norm(statistics, float(args.clip), not args.nolog)
+        BINoculars.plot.plot(space, pyplot.gcf(), pyplot.gca(), label=basename, log=not args.nolog, clipping=float(args.clip), fit=fitdata, norm=norm)
 
         if plotcount > 1 and args.multi == 'grid':
             pyplot.gca().set_title(basename)
@@ -0,0 +1,64 @@
+import os
+import time
+import tempfile
+import numpy
+
+import BINoculars.space
+
+# This script compares HDF5 layouts of a Space file for the access pattern of 'binoculars fit' and fitaid: the rod is
+# read slice by slice along L, each slice is a thin slab of the full volume. For every layout it reports the file size,
+# the time to write, to read all slices and to read the full volume. The data is synthetic: a rod along L on a
+# background, with the large empty regions typical for a reciprocal space map.
+
+fitresolution = 0.05 # width of the slices along L in data coordinates
+
+layouts = (
+    ('auto, gzip', None, 'gzip'),
+    ('L, gzip', 'L', 'gzip'),
+    ('L, gzip:1,shuffle', 'L', 'gzip:1,shuffle'),
+    ('L, lzf', 'L', 'lzf'),
+    ('L, none', 'L', 'none'),
+)
+
+def make_space():
+    axes = BINoculars.space.Axes((BINoculars.space.Axis(-1., 1., 0.01, 'H'), BINoculars.space.Axis(-1., 1., 0.01, 'K'), BINoculars.space.Axis(0., 4., 0.01, 'L')))
+    space = BINoculars.space.Space(axes)
+    h, k, l = (ax.min + ax.res * numpy.arange(len(ax)) for ax in axes)
+    h, k, l = h[:, None, None], k[None, :, None], l[None, None, :]
+    inside = (h ** 2 + k ** 2 < 0.5) & (l >= 0) # detector coverage
+    numpy.random.seed(0)
+    space.contributions[...] = inside * numpy.random.randint(1, 20, space.contributions.shape)
+    space.photons[...] = space.contributions * (0.1 + numpy.exp(-(h ** 2 + k ** 2) / 0.001) * (1 + numpy.cos(l * numpy.pi) ** 2))
+    return space
+
+def read_slices(filename, axes):
+    ax = axes[axes.index('L')]
+    bins = numpy.arange(ax.min, ax.max, fitresolution)
+    for start, stop in zip(bins[:-1], bins[1:]):
+        key = [slice(None) for i in axes]
+        key[axes.index('L')] = slice(start, stop)
+        BINoculars.space.Space.fromfile(filename, key).project('L')
+    return len(bins) - 1
+
+space = make_space()
+print 'Space of {0} points, {1} MB in memory'.format(space.axes.npoints, space.axes.memory_size // 2**20)
+print '{0:<20} {1:>10} {2:>8} {3:>14} {4:>10}'.format('layout', 'size (MB)', 'write', 'slices', 'full read')
+directory = tempfile.mkdtemp()
+for name, chunks, compression in layouts:
+    filename = os.path.join(directory, 'layout.hdf5')
+    start = time.time()
+    space.tofile(filename, chunks=chunks, compression=compression)
+    write = time.time() - start
+
+    start = time.time()
+    count = read_slices(filename, space.axes)
+    slices = time.time() - start
+
+    start = time.time()
+    BINoculars.space.Space.fromfile(filename)
+    full = time.time() - start
+
+    size = os.path.getsize(filename) / 2.**20
+    print '{0:<20} {1:10.1f} {2:7.2f}s {3:7.3f}s/slice {4:9.2f}s'.format(name, size, write, slices / count, full)
+    os.remove(filename)
+os.rmdir(directory)
@@ -0,0 +1,72 @@
+import time
+import numpy
+
+import BINoculars.space
+
+# This script measures how many detector images per second can be binned into a Space. The images are synthetic:
+# a 516 x 516 detector moving through reciprocal space, similar to a theta scan. It compares the current implementation
+# of Space.process_image with the original one, and with binning into a growing Accumulator as done by 'binoculars process'.
+
+BINoculars.space.silence_numpy_errors()
+
+def reference_process_image(space, coordinates, intensity):
+    # the original implementation of Space.process_image, kept here for comparison
+    valid = numpy.isfinite(intensity)
+    intensity = intensity[valid]
+    coordinates = tuple(coord[valid] for coord in coordinates)
+    indices = numpy.array(tuple(ax.get_index(coord) for (ax, coord) in zip(space.axes, coordinates)))
+    for i in range(0, len(space.axes)):
+        for j in range(i+1, len(space.axes)):
+            indices[i,:] *= len(space.axes[j])
+    indices = indices.sum(axis=0).astype(int)
+    photons = numpy.bincount(indices, weights=intensity)
+    contributions = numpy.bincount(indices)
+    space.photons.ravel()[:photons.size] += photons
+    space.contributions.ravel()[:contributions.size] += contributions
+
+def images(count, shape=(516, 516)):
+    x, y = numpy.mgrid[0:shape[0], 0:shape[1]] / float(max(shape))
+    for i in range(count):
+        intensity = numpy.random.random(shape)
+        intensity[:, :5] = numpy.nan # masked pixels
+        yield (x * 0.5 + i * 0.002, y * 0.5 - i * 0.001, x * y + i * 0.002), intensity
+
+def benchmark(name, function, count):
+    data = list(images(count))
+    start = time.time()
+    result = function(data)
+    duration = time.time() - start
+    print '{0:<16} {1:8.1f} images/s'.format(name, count / duration)
+    return result
+
+resolution = 0.004, 0.004, 0.01
+labels = 'H', 'K', 'L'
+count = 100
+
+# the output grid is allocated up front, so only the binning itself is measured
+axes = BINoculars.space.Axes(BINoculars.space.Axis(*limits) for limits in zip((-0.01, -0.11, -0.01), (0.71, 0.51, 1.21), resolution, labels))
+
+def reference(data):
+    space = BINoculars.space.Space(axes)
+    for coordinates, intensity in data:
+        reference_process_image(space, coordinates, intensity)
+    return space
+
+def current(data):
+    space = BINoculars.space.Space(axes)
+    for coordinates, intensity in data:
+        space.process_image(coordinates, intensity)
+    return space
+
+def accumulator(data):
+    return BINoculars.space.bin_images(iter(data), resolution, labels, axes=axes)
+
+numpy.random.seed(0)
+a = benchmark('reference', reference, count)
+numpy.random.seed(0)
+b = benchmark('process_image', current, count)
+numpy.random.seed(0)
+c = benchmark('bin_images', accumulator, count)
+
+assert numpy.allclose(a.photons, b.photons) and (a.contributions == b.contributions).all()
+assert numpy.allclose(a.project('H').photons, c.project('H').photons)
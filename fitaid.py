@@ -1191,8 +1191,8 @@ class OverviewWidget(QtGui.QWidget):
 def interpolate(space):
     data = space.get_masked()
     mask = data.mask
-    grid = numpy.vstack(numpy.ma.array(g, mask=mask).compressed() for g in space.get_grid()).T
-    open = numpy.vstack(numpy.ma.array(g, mask=numpy.invert(mask)).compressed() for g in space.get_grid()).T
+    grid = numpy.vstack(space.get_grid().select(~mask)).T
+    open = numpy.vstack(space.get_grid().select(mask)).T
     if open.shape[0] == 0:
         return data.compressed()
     elif grid.shape[0] == 0:
@@ -1204,8 +1204,8 @@ def interpolate(space):
         mask = numpy.isnan(values)
         if mask.sum() > 0:
             data = numpy.ma.array(values, mask = mask)
-            grid = numpy.vstack(numpy.ma.array(g, mask=mask).compressed() for g in space.get_grid()).T
-            open = numpy.vstack(numpy.ma.array(g, mask=numpy.invert(mask)).compressed() for g in space.get_grid()).T
+            grid = numpy.vstack(space.get_grid().select(~mask)).T
+            open = numpy.vstack(space.get_grid().select(mask)).T
             interpolated = griddata(grid, data.compressed(), open, method = 'nearest')
             values[mask] = interpolated
         return values
@@ -565,20 +565,28 @@ class ProjectWidget(QtGui.QWidget):
             plotoption = self.group.checkedButton().text()
         
         spaces = []
+        statistics = []
 
         for i, filename in enumerate(self.table.selection):
             axes = BINoculars.space.Axes.fromfile(filename)
-            space = BINoculars.space.Space.fromfile(filename, key = axes.restricted_key(self.key))
-            projection = [ax for ax in self.projection if ax in space.axes]
-            if projection:
-                space = space.project(*projection)
+            key = axes.restricted_key(self.key)
+            if key:
+                axes = BINoculars.space.Axes(ax for k, ax in zip(key, axes) if isinstance(k, slice))
+            projection = [ax for ax in self.projection if ax in axes]
+            space = BINoculars.space.Space.fromfile(filename, key = key, project = projection)
             if len(space.axes) > 2 or len(space.axes) == 0:
                 self.errormessage('choose suitable number of projections, plotting only in 1D and 2D')
             spaces.append(space)
+            # the statistics stored with the file cover the full data and the stored projections
+            statistics.append(None if key else BINoculars.space.Statistics.fromfile(filename, project = projection, compute = False))
 
         self.datamin = []
         self.datamax = []
-        for space in spaces:
+        for space, stats in zip(spaces, statistics):
+            if stats is not None and stats.npoints and (stats.minpositive is not None or not log):
+                self.datamin.append(stats.minpositive if log else stats.min)
+                self.datamax.append(stats.max)
+                continue
             data = space.get_masked().compressed()
             if log:
                 data = data[data > 0]
@@ -733,12 +741,11 @@ class ProjectWidget(QtGui.QWidget):
 
         for i, filename in enumerate(self.table.selection):
             axes = BINoculars.space.Axes.fromfile(filename)
-            space = BINoculars.space.Space.fromfile(filename, key = axes.restricted_key(self.key))
-            projection = [ax for ax in self.projection if ax in space.axes]
-            if projection:
-                space = space.project(*projection)
-
-            space.trim()
+            key = axes.restricted_key(self.key)
+            if key:
+                axes = BINoculars.space.Axes(ax for k, ax in zip(key, axes) if isinstance(k, slice))
+            projection = [ax for ax in self.projection if ax in axes]
+            space = BINoculars.space.Space.fromfile(filename, key = key, project = projection, trim = True)
             outfile = BINoculars.util.find_unused_filename(fname)
 
             if ext == '.edf':
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from BINoculars import main, space, util, errors
+
+
+def die(*args):
+    os._exit(9) # like a worker killed by the OOM killer, without reporting
+
+
+class DyingMain(main.Main):
+    def get_reentrant(self):
+        return die
+
+
+class DispatcherTestCase(unittest.TestCase):
+    scans = '1-2'
+    total = 2 * 100 * 100 * 100 # scans * images * pixels, pixels with NaN intensity are skipped
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # the example input prints every image, also from the worker processes
+        self.stdout = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.close(devnull)
+
+    def tearDown(self):
+        os.dup2(self.stdout, 1)
+        os.close(self.stdout)
+        shutil.rmtree(self.directory)
+
+    def config(self, **dispatcher):
+        config = util.ConfigFile('test')
+        config.dispatcher = dict(type='singlecore', destination=os.path.join(self.directory, 'out.hdf5'), overwrite='true')
+        config.dispatcher.update(dispatcher)
+        config.input = dict(type='example:input', wavelength='0.5', centralpixel='50, 50', sdd='636', pixelsize='0.055, 0.055')
+        config.projection = dict(type='example:qprojection', resolution='0.05')
+        return config
+
+    def run_main(self, cls=main.Main, **dispatcher):
+        numpy.random.seed(0)
+        return cls(self.config(**dispatcher), [self.scans])
+
+    def check_output(self, result):
+        self.assertTrue(0 < result.contributions.sum() <= self.total)
+        stored = space.Space.fromfile(os.path.join(self.directory, 'out.hdf5'))
+        self.assertEqual(stored.axes, result.axes)
+        self.assertTrue((stored.contributions == result.contributions).all())
+        return result.contributions.sum()
+
+    def test_local(self):
+        expected = self.check_output(self.run_main().result)
+        for transfer in 'pipe', 'shared', 'shared:' + self.directory:
+            result = self.run_main(type='local', ncores='2', transfer=transfer).result
+            self.assertEqual(self.check_output(result), expected, transfer)
+        self.assertEqual([name for name in os.listdir(self.directory) if name != 'out.hdf5'], []) # shared files are removed
+
+    def test_local_dead_worker(self):
+        self.assertRaises(errors.SubprocessError, self.run_main, DyingMain, type='local', ncores='2')
+
+    def test_threaded(self):
+        expected = self.check_output(self.run_main().result)
+        for storage in 'dense', 'sparse', 'hdf5':
+            config = self.config(type='threaded', ncores='3')
+            config.projection['storage'] = storage
+            result = main.Main(config, [self.scans]).result
+            self.assertIsInstance(result, space.storage_classes[storage])
+            self.assertEqual(self.check_output(result), expected, storage)
+
+    def test_threaded_single_buffer(self):
+        # the threads bin into one shared output, only a single output-sized buffer is allocated
+        shapes = []
+        init = space.Space.__init__
+        def counting_init(self, axes, *args, **kwargs):
+            init(self, axes, *args, **kwargs)
+            shapes.append(self.photons.shape)
+        space.Space.__init__ = counting_init
+        try:
+            config = self.config(type='threaded', ncores='3')
+            config.projection['limits'] = '[-3:3,-3:3,0:6]'
+            numpy.random.seed(0)
+            result = main.Main(config, [self.scans]).result
+        finally:
+            space.Space.__init__ = init
+        self.assertEqual(result.photons.shape, (121, 121, 121))
+        self.assertEqual([shape for shape in shapes if numpy.prod(shape) >= result.npoints], [result.photons.shape])
+
+
+if __name__ == '__main__':
+    unittest.main()
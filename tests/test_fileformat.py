@@ -0,0 +1,178 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import h5py
+import numpy
+
+from BINoculars import space
+
+
+class FileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'space.hdf5')
+        random = numpy.random.RandomState(0)
+        coordinates = tuple(random.randn(20000) for i in range(3))
+        self.space = space.Space.from_image((0.1, 0.1, 0.1), ('H', 'K', 'L'), coordinates, random.rand(20000))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSpaceEqual(self, result, expected):
+        self.assertEqual(result.axes, expected.axes)
+        self.assertTrue(numpy.allclose(result.photons, expected.photons))
+        self.assertTrue((result.contributions == expected.contributions).all())
+
+
+class PyramidTestCase(FileTestCase):
+    def test_levels(self):
+        self.space.tofile(self.filename, pyramid=3)
+        with h5py.File(self.filename, 'r') as fp:
+            self.assertEqual(sorted(fp['pyramid'].keys()), ['2', '4', '8'])
+        self.assertSpaceEqual(space.Space.fromfile(self.filename), self.space)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, resolution=0.1), self.space)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, resolution=0.2), self.space.rebin(2))
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, resolution=0.5), self.space.rebin(2).rebin(2))
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, resolution=(0.2, 0.1, 0.1)), self.space) # every axis must allow the level
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, resolution=10), self.space.rebin(2).rebin(2).rebin(2))
+
+    def test_sliced(self):
+        self.space.tofile(self.filename, pyramid=2)
+        key = slice(-1, 1), slice(None), slice(0, 2)
+        expected = self.space.rebin(2).rebin(2)
+        for ax, k in zip(expected.axes, key):
+            expected = expected.slice(ax.label, k)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, key, resolution=0.4), expected)
+        lazy = space.LazySpace.fromfile(self.filename, resolution=0.4).slice('L', slice(0, 2)).project('K')
+        self.assertSpaceEqual(lazy.load(), self.space.rebin(4).slice('L', slice(0, 2)).project('K'))
+
+
+class ProjectionsTestCase(FileTestCase):
+    def setUp(self):
+        super(ProjectionsTestCase, self).setUp()
+        self.space.tofile(self.filename, pyramid=3, projections=True)
+
+    def test_stored(self):
+        with h5py.File(self.filename, 'r') as fp:
+            self.assertEqual(sorted(fp['projections'].keys()), ['0', '0,1', '0,2', '1', '1,2', '2'])
+        for labels in ('H',), ('K',), ('L',), ('H', 'K'), ('L', 'H'), ('K', 'L'):
+            self.assertSpaceEqual(space.Space.fromfile(self.filename, project=labels), self.space.project(*labels))
+            lazy = space.LazySpace.fromfile(self.filename).project(*labels)
+            self.assertSpaceEqual(lazy.load(), self.space.project(*labels))
+
+    def test_sliced(self):
+        # the stored projections cannot be used when a projected axis is sliced
+        key = slice(-1, 1), slice(None), slice(None)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, key, project=('H',)), self.space.slice('H', slice(-1, 1)).project('H'))
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, key, project=('K',)), self.space.slice('H', slice(-1, 1)).project('K'))
+
+    def test_resolution_and_project(self):
+        for cls in space.Space, space.SparseSpace, space.HDF5Space:
+            expected = cls.fromfile(self.filename, resolution=0.4).project('H')
+            result = cls.fromfile(self.filename, resolution=0.4, project=('H',))
+            self.assertEqual(result.axes, expected.axes)
+            self.assertTrue(numpy.allclose(result.photons, expected.photons))
+            self.assertTrue((result.contributions == expected.contributions).all())
+
+    def test_project_full_resolution(self):
+        expected = space.Space.fromfile(self.filename).project('H')
+        result = space.Space.fromfile(self.filename, project=('H',))
+        self.assertEqual(result.axes, expected.axes)
+        self.assertTrue(numpy.allclose(result.photons, expected.photons))
+
+
+class LayoutTestCase(FileTestCase):
+    def test_compression(self):
+        for spec, options in ('none', (None, False)), ('lzf', ('lzf', False)), ('gzip:4,shuffle', ('gzip', True)), ('gzip', ('gzip', False)):
+            self.space.tofile(self.filename, compression=spec)
+            with h5py.File(self.filename, 'r') as fp:
+                self.assertEqual((fp['counts'].compression, fp['counts'].shuffle), options, spec)
+            self.assertSpaceEqual(space.Space.fromfile(self.filename), self.space)
+        for spec in 'gzip:10', 'zip', 'lzf:1', 'gzip,lzf':
+            self.assertRaises(ValueError, space.compression_options, spec)
+
+    def test_chunks(self):
+        shape = self.space.axes.shape
+        for chunks, expected in (None, None), ('auto', None), ('4,5,6', (4, 5, 6)), ((1000, 1, 1), (shape[0], 1, 1)):
+            layout = space.dataset_layout(self.space.axes, chunks)
+            self.assertEqual(layout.get('chunks'), expected)
+        self.assertEqual(space.dataset_layout(self.space.axes, 'L')['chunks'][2], 1) # slices along L read whole chunks
+        for chunks in '4,5', (0, 1, 1):
+            self.assertRaises(ValueError, space.dataset_layout, self.space.axes, chunks)
+
+        self.space.tofile(self.filename, chunks='L')
+        with h5py.File(self.filename, 'r') as fp:
+            self.assertEqual(fp['counts'].chunks[2], 1)
+            self.assertEqual(fp['contributions'].chunks, fp['counts'].chunks)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename), self.space)
+        key = slice(None), slice(None), slice(0.5, 0.7)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename, key), self.space.slice('L', slice(0.5, 0.7)))
+
+
+class ThreadedWriteTestCase(FileTestCase):
+    def test_threads(self):
+        for chunks in None, '5,6,7', 'K':
+            for compression in 'gzip', 'gzip:1,shuffle', 'lzf', 'none':
+                self.space.tofile(self.filename, chunks=chunks, compression=compression, threads=3)
+                self.assertSpaceEqual(space.Space.fromfile(self.filename), self.space)
+        for cls in space.SparseSpace, space.HDF5Space:
+            cls.from_space(self.space).tofile(self.filename, chunks='5,6,7', threads=3)
+            self.assertSpaceEqual(space.Space.fromfile(self.filename), self.space)
+
+    def test_empty_chunks(self):
+        # chunks without data are not written, but read as zeros
+        data = space.Space(self.space.axes)
+        data.photons[:3, :3, :3] = 1.
+        data.contributions[:3, :3, :3] = 2
+        data.tofile(self.filename, chunks='5,5,5', threads=2)
+        self.assertSpaceEqual(space.Space.fromfile(self.filename), data)
+
+
+class StatisticsTestCase(FileTestCase):
+    def test_stored(self):
+        self.space.tofile(self.filename, pyramid=2, projections=True)
+        with h5py.File(self.filename, 'r') as fp:
+            self.assertIn('statistics', fp)
+            self.assertFalse(any('statistics' in group for group in fp['pyramid'].values()))
+            self.assertTrue(all('statistics' in group for group in fp['projections'].values()))
+        stored = space.Statistics.fromfile(self.filename)
+        expected = space.Statistics.fromspace(self.space)
+        for name in 'bounds', 'photons', 'contributions', 'npoints', 'min', 'max', 'minpositive', 'nonpositive':
+            self.assertEqual(getattr(stored, name), getattr(expected, name), name)
+        self.assertTrue((stored.histogram == expected.histogram).all())
+        projected = space.Statistics.fromfile(self.filename, project=('L',), compute=False)
+        self.assertEqual(projected.npoints, (self.space.project('L').contributions > 0).sum())
+
+    def test_quantile(self):
+        statistics = space.Statistics.fromspace(self.space)
+        data = self.space.get_masked().compressed()
+        for q in 0.01, 0.5, 0.99:
+            self.assertAlmostEqual(numpy.log10(statistics.quantile(q)), numpy.log10(numpy.percentile(data, 100 * q)), delta=0.1)
+        self.assertEqual(statistics.quantile(0), data.min())
+
+    def test_lazy(self):
+        self.space.tofile(self.filename, pyramid=2, projections=True)
+        lazy = space.LazySpace.fromfile(self.filename)
+        self.assertEqual(lazy.statistics().npoints, space.Statistics.fromspace(self.space).npoints)
+        self.assertEqual(lazy.project('K').statistics().npoints, (self.space.project('K').contributions > 0).sum())
+        self.assertIsNone(lazy.slice('K', slice(0, 1)).statistics())
+        self.assertIsNone(space.LazySpace.fromfile(self.filename, resolution=0.4).statistics())
+
+    def test_trim(self):
+        padded = space.Space(space.Axes(space.Axis(ax.imin - 5, ax.imax + 5, ax.res, ax.label) for ax in self.space.axes))
+        padded += self.space
+        padded.tofile(self.filename, projections=True)
+        key = slice(-1, 1), slice(None), slice(None)
+        for cls in space.Space, space.SparseSpace, space.HDF5Space:
+            for kwargs, expected in (dict(), padded), (dict(key=key), padded.slice('H', slice(-1, 1))), (dict(project=('H',)), padded.project('H')):
+                expected = expected.copy()
+                expected.trim()
+                result = cls.fromfile(self.filename, trim=True, **kwargs)
+                self.assertIsInstance(result, cls)
+                self.assertSpaceEqual(result, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from BINoculars import space
+
+
+def random_image(seed, offset=0., n=5000):
+    random = numpy.random.RandomState(seed)
+    return tuple(random.randn(n) + offset for i in range(3)), random.rand(n)
+
+
+class SmallHDF5Space(space.HDF5Space):
+    chunksize = 512 # many chunks and a small cache, such that chunks are evicted and read back
+    cachesize = 4
+
+
+class HDF5SpaceTestCase(unittest.TestCase):
+    resolutions = 0.1, 0.2, 0.3
+    labels = 'H', 'K', 'L'
+
+    def spaces(self, seed=0, offset=0.):
+        coordinates, intensity = random_image(seed, offset)
+        dense = space.Space.from_image(self.resolutions, self.labels, coordinates, intensity)
+        hdf5 = SmallHDF5Space.from_image(self.resolutions, self.labels, coordinates, intensity)
+        return dense, hdf5
+
+    def assertSpaceEqual(self, result, expected):
+        self.assertEqual(result.axes, expected.axes)
+        self.assertTrue(numpy.allclose(result.photons, expected.photons))
+        self.assertTrue((result.contributions == expected.contributions).all())
+
+    def test_process_image(self):
+        dense, hdf5 = self.spaces()
+        self.assertIsInstance(hdf5, space.HDF5Space)
+        self.assertTrue(os.path.exists(hdf5.filename))
+        self.assertSpaceEqual(hdf5, dense)
+        self.assertSpaceEqual(hdf5.todense(), dense)
+        coordinates, intensity = random_image(0) # within the axes, process_image() does not grow the Space
+        hdf5.process_image(coordinates, 2 * intensity)
+        dense.process_image(coordinates, 2 * intensity)
+        self.assertSpaceEqual(hdf5, dense)
+
+    def test_add(self):
+        dense, hdf5 = self.spaces(0)
+        otherdense, otherhdf5 = self.spaces(1, offset=0.5) # partly outside the axes of the first
+        self.assertSpaceEqual(hdf5 + otherhdf5, dense + otherdense)
+        self.assertSpaceEqual(hdf5 + otherdense, dense + otherdense)
+        hdf5 += otherhdf5
+        dense += otherdense
+        self.assertIsInstance(hdf5, space.HDF5Space)
+        self.assertSpaceEqual(hdf5, dense)
+
+    def test_project_slice_rebin(self):
+        dense, hdf5 = self.spaces()
+        self.assertSpaceEqual(hdf5.project('L'), dense.project('L'))
+        self.assertSpaceEqual(hdf5.project('L', 'H'), dense.project('L', 'H'))
+        self.assertSpaceEqual(hdf5.slice('K', slice(-0.5, 0.7)), dense.slice('K', slice(-0.5, 0.7)))
+        self.assertSpaceEqual(hdf5.slice('K', 0.2), dense.slice('K', 0.2))
+        self.assertSpaceEqual(hdf5.rebin(2), dense.rebin(2))
+        self.assertSpaceEqual(hdf5.rebin((3, 1, 2)), dense.rebin((3, 1, 2)))
+
+    def test_pickle(self):
+        dense, hdf5 = self.spaces()
+        filename = hdf5.filename
+        copy = pickle.loads(pickle.dumps(hdf5, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(copy.filename, filename)
+        del hdf5 # the copy owns the scratch file now
+        self.assertTrue(os.path.exists(filename))
+        self.assertSpaceEqual(copy, dense)
+        del copy
+        self.assertFalse(os.path.exists(filename))
+
+    def test_scratch_files(self):
+        dense, hdf5 = self.spaces()
+        filename = hdf5.filename
+        hdf5.close()
+        self.assertFalse(os.path.exists(filename))
+        dense, hdf5 = self.spaces()
+        filename = hdf5.filename
+        self.assertIn(hdf5, space.HDF5Space.instances)
+        space.close_scratch_spaces() # e.g. at exit, or in a failing worker process
+        self.assertFalse(os.path.exists(filename))
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            dense, hdf5 = self.spaces()
+            filename = os.path.join(directory, 'hdf5.hdf5')
+            hdf5.tofile(filename)
+            self.assertSpaceEqual(space.Space.fromfile(filename), dense)
+            result = space.HDF5Space.fromfile(filename)
+            self.assertIsInstance(result, space.HDF5Space)
+            self.assertSpaceEqual(result, dense)
+            key = slice(None), slice(-0.5, 0.7), slice(None)
+            self.assertSpaceEqual(space.HDF5Space.fromfile(filename, key), space.Space.fromfile(filename, key))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
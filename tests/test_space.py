@@ -0,0 +1,125 @@
+import unittest
+
+import numpy
+
+from BINoculars import space
+
+
+class SpaceTestCase(unittest.TestCase):
+    def assertSpaceEqual(self, result, expected):
+        # space.sum() can round an axis outwards by one step, compare on the grid of expected
+        self.assertTrue(all(ax in other for ax, other in zip(result.axes, expected.axes)))
+        embedded = space.Space(expected.axes)
+        embedded += result
+        self.assertTrue(numpy.allclose(embedded.photons, expected.photons))
+        self.assertTrue((embedded.contributions == expected.contributions).all())
+
+
+class AccumulatorTestCase(SpaceTestCase):
+    def images(self, count=20):
+        # a scan moving through the grid, every image partly outside the extent of the previous ones
+        random = numpy.random.RandomState(0)
+        for i in range(count):
+            coordinates = tuple(random.rand(500) + offset * i for offset in (0.1, 0.05, 0.))
+            yield coordinates, random.rand(500)
+
+    def test_accumulate(self):
+        spaces = [space.Space.from_image((0.1, 0.1, 0.1), ('H', 'K', 'L'), coordinates, intensity) for coordinates, intensity in self.images()]
+        expected = space.sum(spaces)
+        accumulator = space.Accumulator.from_space(spaces[0])
+        buffers = []
+        for s in spaces[1:]:
+            accumulator += s
+            buffers.append(accumulator._photons) # kept alive, such that the ids are unique
+        self.assertLess(len(set(id(buffer) for buffer in buffers)), len(spaces) // 2) # grows with headroom instead of at every addition
+        self.assertSpaceEqual(accumulator, expected)
+        result = accumulator.compact()
+        self.assertIs(result.__class__, space.Space)
+        self.assertSpaceEqual(result, expected)
+        self.assertTrue(result.photons.flags.c_contiguous)
+        self.assertSpaceEqual(space.chunked_sum(iter(spaces), chunksize=3), expected)
+
+    def test_compact_without_headroom(self):
+        random = numpy.random.RandomState(0)
+        data = space.Space.from_image((0.1, 0.1), ('H', 'K'), (random.rand(100), random.rand(100)), random.rand(100))
+        accumulator = space.Accumulator.from_space(data)
+        self.assertEqual(accumulator.capacity, accumulator.axes)
+        result = accumulator.compact()
+        self.assertIs(result.photons, accumulator._photons) # the buffers are handed over, not copied
+        self.assertEqual(result.axes, data.axes)
+        self.assertTrue(numpy.allclose(result.photons, data.photons))
+
+    def test_bin_images(self):
+        images = list(self.images())
+        expected = space.sum(space.Space.from_image((0.1, 0.1, 0.1), ('H', 'K', 'L'), coordinates, intensity) for coordinates, intensity in images)
+        for cls in space.Space, space.SparseSpace, space.HDF5Space:
+            result = space.bin_images(iter(images), (0.1, 0.1, 0.1), ('H', 'K', 'L'), cls=cls, chunksize=3)
+            self.assertIsInstance(result, cls)
+            self.assertSpaceEqual(result, expected)
+
+
+class LimitsTestCase(SpaceTestCase):
+    resolutions = 0.1, 0.1
+    labels = 'H', 'K'
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.images = [((random.randn(1000), random.randn(1000)), random.rand(1000)) for i in range(5)]
+
+    def expected(self, bounds):
+        result = space.EmptySpace()
+        for (h, k), intensity in self.images:
+            valid = numpy.ones(intensity.shape, dtype=bool)
+            for coord, (lo, hi) in zip((h, k), bounds):
+                index = numpy.around(coord / 0.1)
+                if lo is not None:
+                    valid &= index >= lo
+                if hi is not None:
+                    valid &= index <= hi
+            result += space.Space.from_image(self.resolutions, self.labels, (h[valid], k[valid]), intensity[valid])
+        return result
+
+    def test_limits(self):
+        limits = (-1., 0.55), (None, 0.5)
+        bounds = space.limit_bounds(limits, self.resolutions)
+        self.assertEqual(bounds, ((-10, 6), (None, 5)))
+        result = space.bin_images(iter(self.images), self.resolutions, self.labels, limits=limits)
+        self.assertEqual(result.axes, space.Axes(space.Axis(lo, hi, 0.1, label) for (lo, hi), label in zip(((-10, 6), (-30, 5)), self.labels)))
+        self.assertSpaceEqual(result, self.expected(bounds))
+
+    def test_allocated_once(self):
+        limits = (-1., 1.), (-2., 2.)
+        axes = space.Axes(space.Axis(lo, hi, 0.1, label) for (lo, hi), label in zip(((-10, 10), (-20, 20)), self.labels))
+        shapes = []
+        init = space.Space.__init__
+        def counting_init(self, axes, *args, **kwargs):
+            init(self, axes, *args, **kwargs)
+            shapes.append(self.photons.shape)
+        space.Space.__init__ = counting_init
+        try:
+            result = space.bin_images(iter(self.images), self.resolutions, self.labels, limits=limits)
+        finally:
+            space.Space.__init__ = init
+        self.assertEqual(result.axes, axes)
+        self.assertEqual(shapes, [axes.shape])
+        self.assertEqual(result.contributions.sum(), self.expected(((-10, 10), (-20, 20))).contributions.sum())
+
+
+class Rebin2TestCase(unittest.TestCase):
+    def test_against_from_image(self):
+        # rebin2() used to bin the coordinates of every grid point again with from_image()
+        random = numpy.random.RandomState(0)
+        data = space.Space.from_image((0.1, 0.2, 0.3), ('H', 'K', 'L'), tuple(random.randn(5000) for i in range(3)), random.rand(5000))
+        for resolutions in (0.25, 0.3, 0.5), (0.05, 0.2, 1.):
+            coordinates = tuple(grid.flatten() for grid in data.get_grid())
+            expected = space.Space.from_image(resolutions, ('H', 'K', 'L'), coordinates, data.photons.flatten())
+            contributions = space.Space.from_image(resolutions, ('H', 'K', 'L'), coordinates, data.contributions.flatten().astype(float)).photons
+            result = data.rebin2(resolutions)
+            self.assertEqual(result.axes, expected.axes)
+            self.assertTrue(numpy.allclose(result.photons, expected.photons))
+            self.assertTrue((result.contributions == numpy.around(contributions)).all())
+            self.assertEqual(result.contributions.sum(), data.contributions.sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
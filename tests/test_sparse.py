@@ -0,0 +1,83 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from BINoculars import space
+
+
+def random_image(seed, offset=0., n=5000):
+    random = numpy.random.RandomState(seed)
+    return tuple(random.randn(n) + offset for i in range(3)), random.rand(n)
+
+
+class SparseSpaceTestCase(unittest.TestCase):
+    resolutions = 0.1, 0.2, 0.3
+    labels = 'H', 'K', 'L'
+
+    def spaces(self, seed=0, offset=0.):
+        coordinates, intensity = random_image(seed, offset)
+        dense = space.Space.from_image(self.resolutions, self.labels, coordinates, intensity)
+        sparse = space.SparseSpace.from_image(self.resolutions, self.labels, coordinates, intensity)
+        return dense, sparse
+
+    def assertSpaceEqual(self, result, expected):
+        self.assertEqual(result.axes, expected.axes)
+        self.assertTrue(numpy.allclose(result.photons, expected.photons))
+        self.assertTrue((result.contributions == expected.contributions).all())
+
+    def test_process_image(self):
+        dense, sparse = self.spaces()
+        self.assertIsInstance(sparse, space.SparseSpace)
+        self.assertSpaceEqual(sparse, dense)
+        self.assertSpaceEqual(sparse.todense(), dense)
+        self.assertEqual(len(sparse.indices), (dense.contributions > 0).sum())
+        self.assertLess(sparse.memory_size, dense.memory_size)
+
+    def test_add(self):
+        dense, sparse = self.spaces(0)
+        otherdense, othersparse = self.spaces(1, offset=0.5) # partly outside the axes of the first
+        self.assertSpaceEqual(sparse + othersparse, dense + otherdense)
+        self.assertSpaceEqual(sparse + otherdense, dense + otherdense)
+        sparse += othersparse
+        dense += otherdense
+        self.assertIsInstance(sparse, space.SparseSpace)
+        self.assertSpaceEqual(sparse, dense)
+
+    def test_project_slice_rebin(self):
+        dense, sparse = self.spaces()
+        self.assertSpaceEqual(sparse.project('L'), dense.project('L'))
+        self.assertSpaceEqual(sparse.project('L', 'H'), dense.project('L', 'H'))
+        self.assertSpaceEqual(sparse.slice('K', slice(-0.5, 0.7)), dense.slice('K', slice(-0.5, 0.7)))
+        self.assertSpaceEqual(sparse.slice('K', 0.2), dense.slice('K', 0.2))
+        self.assertSpaceEqual(sparse.rebin(2), dense.rebin(2))
+        self.assertSpaceEqual(sparse.rebin((3, 1, 2)), dense.rebin((3, 1, 2)))
+
+    def test_pickle(self):
+        dense, sparse = self.spaces()
+        copy = pickle.loads(pickle.dumps(sparse, pickle.HIGHEST_PROTOCOL))
+        self.assertIsInstance(copy, space.SparseSpace)
+        self.assertSpaceEqual(copy, dense)
+        self.assertLess(len(pickle.dumps(sparse, pickle.HIGHEST_PROTOCOL)), len(pickle.dumps(dense, pickle.HIGHEST_PROTOCOL)))
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            dense, sparse = self.spaces()
+            filename = os.path.join(directory, 'sparse.hdf5')
+            sparse.tofile(filename)
+            self.assertSpaceEqual(space.Space.fromfile(filename), dense)
+            result = space.SparseSpace.fromfile(filename)
+            self.assertIsInstance(result, space.SparseSpace)
+            self.assertSpaceEqual(result, dense)
+            key = slice(None), slice(-0.5, 0.7), slice(None)
+            self.assertSpaceEqual(space.SparseSpace.fromfile(filename, key), space.Space.fromfile(filename, key))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy
+
+from BINoculars import util
+
+
+class ExpressionProgramTestCase(unittest.TestCase):
+    labels = 'H', 'K', 'L'
+    expressions = ('sqrt(H**2+K**2+L**2)', 'arctan2(K, H) * 180 / pi', 'H - 2 * K', '-L', 'abs(H) + abs(H)',
+                   'where(H > 0, H, 0)', 'clip(K, -0.5, 0.5)', 'e', '2 ** 3', 'H', 'sin(H) ** 2 + cos(H) ** 2', 'L % 0.5')
+
+    def setUp(self):
+        numpy.random.seed(0)
+
+    def evaluate(self, exprs, coords):
+        namespace = dict((name, getattr(numpy, name)) for name in dir(numpy))
+        namespace.update(zip(self.labels, coords))
+        return tuple(eval(expr, namespace) for expr in exprs)
+
+    def check(self, exprs, shape, blocksize):
+        coords = tuple(numpy.random.randn(*shape) for label in self.labels)
+        program = util.ExpressionProgram(self.labels, exprs)
+        program.blocksize = blocksize
+        results = program(*coords)
+        expected = self.evaluate(exprs, coords)
+        self.assertEqual(len(results), len(expected))
+        for expr, result, value in zip(exprs, results, expected):
+            self.assertEqual(numpy.shape(result), numpy.shape(value), expr)
+            self.assertTrue(numpy.allclose(result, value), expr)
+
+    def test_against_eval(self):
+        for shape in (20, 7), (200, 7): # smaller and larger than the block size
+            self.check(self.expressions, shape, 500)
+            for expr in self.expressions:
+                self.check((expr,), shape, 500)
+
+    def test_blockwise_single_rows(self):
+        self.check(self.expressions, (50, 3), 1)
+
+    def test_separate_outputs(self):
+        program = util.ExpressionProgram(self.labels, ('sqrt(H)', 'sqrt(H)', 'array([1., 2.])', 'array([1., 2.])'))
+        for shape in (20, 7), (200, 7):
+            program.blocksize = 500
+            coords = tuple(numpy.random.rand(*shape) for label in self.labels)
+            first, second, third, fourth = program(*coords)
+            self.assertIsNot(first, second)
+            self.assertIsNot(third, fourth)
+            first[...] = 0
+            third[...] = 0
+            self.assertTrue(numpy.allclose(second, numpy.sqrt(coords[0])))
+            self.assertTrue(numpy.allclose(fourth, [1., 2.]))
+            self.assertTrue(numpy.allclose(program(*coords)[2], [1., 2.]))
+
+    def test_fallback(self):
+        coords = tuple(numpy.random.randn(10) for label in self.labels)
+        exprs = 'H[::-1]', 'K.sum()'
+        for result, value in zip(util.ExpressionProgram(self.labels, exprs)(*coords), self.evaluate(exprs, coords)):
+            self.assertTrue(numpy.allclose(result, value))
+
+
+if __name__ == '__main__':
+    unittest.main()